@@ -4,31 +4,114 @@ import math
 import random
 import json
 import os
+import socket
+import argparse
+import time
+import functools
+import ctypes
+import ctypes.util
+import glob
+import itertools
+from array import array
+from collections import deque, OrderedDict
 from datetime import datetime
 
-# 初始化pygame
-pygame.init()
-
-# 设置窗口比例 16:10，启用OPENGL支持和双缓冲以支持更好的垂直同步
-screen_width = 1280
-screen_height = 800
-screen = pygame.display.set_mode((screen_width, screen_height), pygame.OPENGL | pygame.DOUBLEBUF)
-pygame.display.set_caption("Aim Trainer - 目标训练 v3.0.5")
-
-# 尝试启用垂直同步
-try:
-    pygame.display.gl_set_attribute(pygame.GL_SWAP_CONTROL, 1)
-except:
-    # 如果系统不支持VSync，则忽略
-    pass
-
-# 导入OpenGL库以支持垂直同步
-try:
-    from pygame.locals import *
-    import OpenGL.GL as gl
-except ImportError:
-    # 如果OpenGL不可用，则使用普通双缓冲
-    screen = pygame.display.set_mode((screen_width, screen_height), pygame.HWSURFACE | pygame.DOUBLEBUF)
+from leaderboard_service import LeaderboardClient, parse_address
+from frame_capture import FrameCapture, CAPTURE_FORMATS
+from evdev_input import open_input_device
+from trace_format import TRACE_MAGIC, TRACE_VERSION, TRACE_HEADER, TRACE_RECORD, TRACE_DIR
+
+# 初始化pygame（录制的编码子进程以spawn方式启动，会以 __mp_main__ 的名义重新导入本文件，
+# 子进程不需要显示和音频，跳过初始化）
+if __name__ != "__mp_main__":
+    pygame.init()
+
+# 设计基准分辨率 16:10，所有布局按此基准等比换算
+BASE_SCREEN_WIDTH = 1280
+BASE_SCREEN_HEIGHT = 800
+
+WINDOW_TITLE = "Aim Trainer - 目标训练 v3.12.0"
+
+# 当前窗口尺寸和渲染后端（由 setup_display 设置）
+screen_width = BASE_SCREEN_WIDTH
+screen_height = BASE_SCREEN_HEIGHT
+screen = None  # 软件渲染后端的显示表面（SDL2纹理后端为None）
+backend = None  # 当前渲染后端 (SoftwareBackend / TextureBackend)
+render_scale = 1.0  # 游戏区域内部渲染比例（<1时以较低分辨率渲染后放大）
+
+def setup_display(width=BASE_SCREEN_WIDTH, height=BASE_SCREEN_HEIGHT, fullscreen=False, scale=1.0, renderer="software"):
+    """创建窗口和渲染后端"""
+    global screen, screen_width, screen_height, render_scale, backend
+    
+    # 宽高为0时使用桌面分辨率
+    if width <= 0 or height <= 0:
+        desktop_width, desktop_height = pygame.display.get_desktop_sizes()[0]
+        width = width if width > 0 else desktop_width
+        height = height if height > 0 else desktop_height
+    render_scale = min(1.0, max(0.25, scale))
+    
+    backend = None
+    screen = None
+    if renderer == "sdl2":
+        # SDL2 Renderer纹理后端：没有GPU时使用SDL自带的软件Renderer，
+        # pygame._sdl2 不可用时退回软件后端
+        try:
+            backend = TextureBackend((width, height), fullscreen, render_scale)
+        except (ImportError, RuntimeError):  # pygame.error 和 _sdl2 的错误都是 RuntimeError
+            backend = None
+    
+    if backend is None:
+        # 软件后端：在显示表面上绘制后整体刷新（不再请求OPENGL，软件绘制无法用到它）
+        flags = pygame.FULLSCREEN if fullscreen else 0
+        screen = pygame.display.set_mode((width, height), flags | pygame.DOUBLEBUF)
+        pygame.display.set_caption(WINDOW_TITLE)
+        backend = SoftwareBackend(screen)
+        if render_scale < 1.0:
+            # 软件后端每帧放大游戏区域的开销比直接按窗口分辨率绘制还大
+            print("--render-scale needs the sdl2 renderer, rendering at full resolution")
+    
+    screen_width, screen_height = backend.size
+    return backend
+
+class SDLDisplayMode(ctypes.Structure):
+    """SDL_DisplayMode"""
+    _fields_ = [("format", ctypes.c_uint32), ("w", ctypes.c_int), ("h", ctypes.c_int),
+                ("refresh_rate", ctypes.c_int), ("driverdata", ctypes.c_void_p)]
+
+def load_sdl_library():
+    """找到pygame自带的SDL2动态库（与pygame使用同一份，已初始化的显示状态共享）"""
+    package_dir = os.path.dirname(pygame.__file__)
+    patterns = [os.path.join(package_dir, "SDL2.dll"),  # Windows
+                os.path.join(package_dir, ".dylibs", "libSDL2*.dylib"),  # macOS
+                os.path.join(os.path.dirname(package_dir), "pygame.libs", "libSDL2-2*.so*")]  # Linux
+    for pattern in patterns:
+        for path in glob.glob(pattern):
+            try:
+                return ctypes.CDLL(path)
+            except OSError:
+                continue
+    try:
+        return ctypes.CDLL(ctypes.util.find_library("SDL2"))
+    except (OSError, TypeError):
+        return None
+
+def get_refresh_rate(default=240):
+    """获取窗口所在显示器的刷新率（pygame 2.6没有对应接口，通过SDL_GetCurrentDisplayMode查询），查询不到时返回默认值"""
+    sdl = load_sdl_library()
+    if sdl is not None:
+        try:
+            if hasattr(backend, "window"):
+                display_index = backend.window.display_index
+            else:
+                from pygame._sdl2 import video
+                display_index = video.Window.from_display_module().display_index
+            mode = SDLDisplayMode()
+            if sdl.SDL_GetCurrentDisplayMode(display_index, ctypes.byref(mode)) == 0 and mode.refresh_rate > 0:
+                return mode.refresh_rate
+        except (AttributeError, ImportError, OSError, RuntimeError):
+            pass
+    print(f"Display refresh rate unknown, using {default} FPS")
+    return default
 
 # 颜色定义
 BACKGROUND_COLOR = (204, 204, 204)  # #CCCCCC
@@ -38,6 +121,483 @@ PANEL_COLOR = (240, 240, 240)
 RED = (255, 0, 0)
 BUTTON_COLOR = (100, 150, 200)
 BUTTON_HOVER_COLOR = (120, 170, 220)
+GHOST_COLOR = (120, 120, 120)
+
+# 模式特定的比例参数：(球体直径比例, 方格与球体直径比例)
+MODE_RATIOS = {
+    "mod_1": (1.0, 1.5),   # 模式1: 球体直径比例 (基准)，方格边长是球体直径的1.5倍
+    "mod_2": (1.75, 1.3),  # 模式2: 球体直径是模式1的1.75倍，方格边长是球体直径的1.3倍
+    "mod_3": (1.75, 1.3),  # 模式3: 复用模式2规则
+}
+
+class Layout:
+    """
+    某一分辨率下的全部布局参数
+    
+    所有尺寸都从窗口尺寸按基准分辨率 (1280x800) 等比换算得出，
+    每种分辨率只计算一次（见 get_layout）。
+    """
+    def __init__(self, width, height):
+        self.screen_width = width
+        self.screen_height = height
+        # 界面缩放比例（字体、面板、按钮按此缩放）
+        self.ui_scale = min(width / BASE_SCREEN_WIDTH, height / BASE_SCREEN_HEIGHT)
+        
+        # 信息面板和游戏区域
+        self.panel_width = int(250 * self.ui_scale)
+        self.panel_height = height
+        self.panel_x = width - self.panel_width
+        self.panel_y = 0
+        self.game_width = width - self.panel_width
+        self.game_height = height
+        self.line_height = int(40 * self.ui_scale)  # 面板行距
+        self.panel_padding = int(10 * self.ui_scale)
+        
+        # 基础网格大小 (所有模式共享)
+        self.base_grid_size = int(min(self.game_width, self.game_height) * 0.08)
+        self.base_ball_diameter = (self.base_grid_size // 2) * 2 - 4  # 基础球体直径
+        
+        # 各模式的球体和网格尺寸
+        self.mode_geometry = {}
+        for game_mode, (ball_diameter_ratio, grid_ball_ratio) in MODE_RATIOS.items():
+            actual_ball_diameter = int(self.base_ball_diameter * ball_diameter_ratio)
+            grid_size = int(actual_ball_diameter * grid_ball_ratio)
+            self.mode_geometry[game_mode] = {
+                "ball_diameter_ratio": ball_diameter_ratio,
+                "grid_ball_ratio": grid_ball_ratio,
+                "actual_ball_diameter": actual_ball_diameter,
+                "ball_radius": actual_ball_diameter // 2,
+                "grid_size": grid_size,
+                "cols": self.game_width // grid_size,
+                "rows": self.game_height // grid_size,
+            }
+        
+        # 模式选择按钮 - 三个模式水平排列并居中
+        button_width = int(120 * self.ui_scale)
+        button_height = int(60 * self.ui_scale)
+        spacing = int(150 * self.ui_scale)  # 按钮间距
+        total_width = 3 * button_width + 2 * spacing
+        start_x = width // 2 - total_width // 2
+        button_y = height // 2 - int(50 * self.ui_scale)
+        self.mode_buttons = [
+            (start_x + i * (button_width + spacing), button_y, button_width, button_height)
+            for i in range(3)
+        ]
+        
+        # 无尽模式开关按钮 - 位于模式说明下方居中
+        toggle_width = int(240 * self.ui_scale)
+        toggle_height = int(44 * self.ui_scale)
+        self.endless_button = (width // 2 - toggle_width // 2, button_y + button_height + int(80 * self.ui_scale),
+                               toggle_width, toggle_height)
+    
+    def font_size(self, base_size):
+        """按界面缩放比例换算字体大小"""
+        return max(8, int(base_size * self.ui_scale))
+
+@functools.lru_cache(maxsize=None)
+def get_layout(width, height):
+    """获取指定分辨率的布局（按分辨率缓存）"""
+    return Layout(width, height)
+
+@functools.lru_cache(maxsize=None)
+def get_font(size):
+    """获取指定大小的默认字体（缓存，避免重复加载字体文件）"""
+    return pygame.font.Font(None, size)
+
+class SoundBank:
+    """
+    预加载的点击音效
+    
+    启动时用较小的混音缓冲区初始化mixer，把所有音效一次性解码到内存，并预留一组通道
+    轮流使用；点击时只在预留通道上播放已解码的缓冲区，不分配内存也不解码。
+    resources/sounds 下有 hit/miss/combo 的 .wav 或 .ogg 文件时使用文件，否则合成简单的提示音。
+    """
+    SOUNDS = {
+        # 名称: (合成音频率Hz, 时长毫秒)
+        "hit": (880, 40),
+        "miss": (220, 80),
+        "combo": (1320, 90),
+    }
+    
+    def __init__(self, sound_dir=os.path.join("resources", "sounds"), buffer=256, frequency=44100, reserved_channels=4):
+        self.enabled = False
+        self.sounds = {}
+        self.channels = []
+        self.next_channel = 0
+        self.buffer = buffer
+        self.frequency = frequency
+        self.dispatch_times = deque(maxlen=120)  # 最近的播放调用耗时 (毫秒)
+        
+        try:
+            # 重新初始化mixer以使用指定的缓冲区大小（pygame.init()时使用的是默认值）
+            pygame.mixer.quit()
+            pygame.mixer.init(frequency=frequency, size=-16, channels=2, buffer=buffer)
+            self.frequency, self.sample_size, self.output_channels = pygame.mixer.get_init()
+        except (pygame.error, TypeError):
+            # 没有可用的音频设备
+            return
+        
+        # 预留通道池，播放时轮流使用，不与其他声音抢占
+        pygame.mixer.set_num_channels(max(8, reserved_channels))
+        pygame.mixer.set_reserved(reserved_channels)
+        self.channels = [pygame.mixer.Channel(i) for i in range(reserved_channels)]
+        
+        for name, (tone, duration) in self.SOUNDS.items():
+            sound = self.load_sound(sound_dir, name)
+            if sound is None:
+                sound = self.synthesize(tone, duration)
+            if sound is not None:
+                self.sounds[name] = sound
+        self.enabled = bool(self.sounds)
+    
+    def load_sound(self, sound_dir, name):
+        """从音效文件夹加载并解码音效，文件不存在时返回None"""
+        for ext in (".wav", ".ogg"):
+            path = os.path.join(sound_dir, name + ext)
+            if os.path.exists(path):
+                try:
+                    return pygame.mixer.Sound(path)
+                except pygame.error:
+                    return None
+        return None
+    
+    def synthesize(self, tone, duration, volume=0.3):
+        """合成一段带淡出的正弦提示音"""
+        if self.sample_size != -16:
+            return None  # 只支持16位有符号采样格式
+        sample_count = int(self.frequency * duration / 1000)
+        amplitude = 32767 * volume
+        samples = array('h')
+        for i in range(sample_count):
+            fade = 1.0 - i / sample_count
+            value = int(amplitude * fade * math.sin(2 * math.pi * tone * i / self.frequency))
+            samples.extend([value] * self.output_channels)
+        return pygame.mixer.Sound(buffer=samples.tobytes())
+    
+    def play(self, name):
+        """在预留通道上播放音效（点击路径上调用）"""
+        if not self.enabled:
+            return
+        start = time.perf_counter()
+        channel = self.channels[self.next_channel]
+        self.next_channel = (self.next_channel + 1) % len(self.channels)
+        channel.play(self.sounds[name])
+        self.dispatch_times.append((time.perf_counter() - start) * 1000)
+    
+    def output_latency(self):
+        """混音缓冲区带来的输出延迟（毫秒）"""
+        return self.buffer / self.frequency * 1000 if self.enabled else 0.0
+    
+    def average_latency(self):
+        """平均音频延迟 = 播放调用耗时 + 混音缓冲区延迟（毫秒）"""
+        if not self.dispatch_times:
+            return self.output_latency()
+        return sum(self.dispatch_times) / len(self.dispatch_times) + self.output_latency()
+
+class FrameTimer:
+    """最近若干帧的帧时间统计（毫秒）"""
+    def __init__(self, window=120):
+        self.frame_times = deque(maxlen=window)
+    
+    def add(self, frame_time):
+        self.frame_times.append(frame_time)
+    
+    def average(self):
+        if not self.frame_times:
+            return 0.0
+        return sum(self.frame_times) / len(self.frame_times)
+
+# 点击音效（由 main 创建，--no-sound 时为None）
+sound_bank = None
+# 帧时间统计（只统计按帧率渲染的帧）
+frame_timer = FrameTimer()
+# 画面录制（通过 --capture 启用，未启用时为None）
+frame_recorder = None
+
+class RenderBackend:
+    """
+    渲染后端基类：统一的绘制接口 + 每帧CPU时间和上传字节数统计
+    
+    坐标都是窗口坐标。begin_game_area/end_game_area 之间绘制的是游戏区域，
+    后端可以按内部渲染比例处理；文字总是按窗口分辨率绘制。
+    """
+    name = "base"
+    
+    def __init__(self, size, text_cache_size=512):
+        self.size = size
+        self.frame_cpu_times = deque(maxlen=120)  # 每帧CPU时间 (毫秒)
+        self.frame_upload_bytes = deque(maxlen=120)  # 每帧上传字节数
+        self.frame_start = None
+        self.upload_bytes = 0
+        self.text_cache = OrderedDict()  # (字体, 文字, 颜色) -> 表面/纹理，按最近使用淘汰
+        self.text_cache_size = text_cache_size
+    
+    def begin_frame(self):
+        self.frame_start = time.perf_counter()
+        self.upload_bytes = 0
+    
+    def end_frame(self):
+        if self.frame_start is not None:
+            self.frame_cpu_times.append((time.perf_counter() - self.frame_start) * 1000)
+            self.frame_upload_bytes.append(self.upload_bytes)
+            self.frame_start = None
+    
+    def average_cpu_time(self):
+        return sum(self.frame_cpu_times) / len(self.frame_cpu_times) if self.frame_cpu_times else 0.0
+    
+    def average_upload_bytes(self):
+        return sum(self.frame_upload_bytes) / len(self.frame_upload_bytes) if self.frame_upload_bytes else 0.0
+    
+    def stats_summary(self):
+        return f"{self.name}: CPU {self.average_cpu_time():.2f}ms/frame, upload {self.average_upload_bytes() / 1024:.1f}KB/frame"
+    
+    def cached_text(self, font, text, color, create):
+        """文字缓存（LRU），未命中时调用create生成"""
+        key = (id(font), text, color)
+        item = self.text_cache.get(key)
+        if item is not None:
+            self.text_cache.move_to_end(key)
+            return item
+        item = create(font.render(text, True, color))
+        self.text_cache[key] = item
+        if len(self.text_cache) > self.text_cache_size:
+            self.text_cache.popitem(last=False)
+        return item
+    
+    def begin_game_area(self, rect):
+        pass
+    
+    def end_game_area(self):
+        pass
+
+class SoftwareBackend(RenderBackend):
+    """软件渲染后端：用pygame.draw在显示表面上绘制，每帧整体刷新到窗口（始终按窗口分辨率绘制）"""
+    name = "software"
+    
+    def __init__(self, surface):
+        super().__init__(surface.get_size())
+        self.screen = surface
+        self.image_cache = {}
+    
+    def begin_game_area(self, rect):
+        self.screen.set_clip(pygame.Rect(rect))
+    
+    def end_game_area(self):
+        self.screen.set_clip(None)
+    
+    def fill(self, color, rect=None):
+        self.screen.fill(color, pygame.Rect(rect) if rect is not None else None)
+    
+    def rect(self, color, rect, width=0):
+        pygame.draw.rect(self.screen, color, pygame.Rect(rect), int(width))
+    
+    def line(self, color, start, end, width=1):
+        pygame.draw.line(self.screen, color, (int(start[0]), int(start[1])), (int(end[0]), int(end[1])), int(width))
+    
+    def circle(self, color, center, radius, width=0):
+        pygame.draw.circle(self.screen, color, (int(center[0]), int(center[1])), int(radius), int(width))
+    
+    def ball(self, color, center, radius):
+        """实心圆 + 1像素黑色描边"""
+        center = (int(center[0]), int(center[1]))
+        pygame.draw.circle(self.screen, color, center, int(radius))
+        pygame.draw.circle(self.screen, (0, 0, 0), center, int(radius), 1)
+    
+    def text(self, font, text, color, pos, anchor="topleft", alpha=255):
+        surface = self.cached_text(font, text, color, lambda rendered: rendered)
+        if alpha < 255:
+            # 创建带透明度的副本
+            surface = surface.copy()
+            surface.set_alpha(alpha)
+        rect = surface.get_rect(**{anchor: (int(pos[0]), int(pos[1]))})
+        self.screen.blit(surface, rect)
+        return rect
+    
+    def image(self, key, surface, rect, version=0):
+        """把表面缩放到rect绘制，缩放结果按key和version缓存"""
+        target_rect = pygame.Rect(rect)
+        cached = self.image_cache.get(key)
+        if cached is None or cached[0] != version or cached[1].get_size() != target_rect.size:
+            cached = (version, pygame.transform.scale(surface, target_rect.size))
+            self.image_cache[key] = cached
+        self.screen.blit(cached[1], target_rect)
+    
+    def frame_surface(self):
+        """本帧合成好的画面"""
+        return self.screen
+    
+    def present(self):
+        pygame.display.flip()
+        # 每次刷新都把整个窗口表面交给系统合成
+        self.upload_bytes += self.screen.get_width() * self.screen.get_height() * self.screen.get_bytesize()
+        self.end_frame()
+
+class TextureBackend(RenderBackend):
+    """
+    SDL2 Renderer纹理后端 (pygame._sdl2.video)
+    
+    小球、文字和叠加层只在第一次出现或内容变化时上传为纹理，之后每帧由Renderer合成；
+    没有GPU时使用SDL的软件Renderer。内部渲染比例<1时游戏区域先画到较小的渲染目标纹理，
+    再由GPU放大到窗口（软件Renderer不使用内部渲染比例）。
+    """
+    def __init__(self, size, fullscreen=False, scale=1.0):
+        from pygame._sdl2 import sdl2, video
+        self.video = video
+        self.window = video.Window(WINDOW_TITLE, size=size, fullscreen=fullscreen)
+        try:
+            self.renderer = video.Renderer(self.window, accelerated=1, vsync=True)
+            self.name = "sdl2"
+        except sdl2.error:
+            try:
+                self.renderer = video.Renderer(self.window, accelerated=0)
+                self.name = "sdl2-software"
+            except sdl2.error:
+                self.window.destroy()
+                raise
+        super().__init__(tuple(self.window.size))
+        self.shape_cache = {}  # 小球/圆环纹理
+        self.readback = None  # 录制时读回画面用的表面（第一次录制时分配）
+        self.image_cache = {}  # key -> (version, 纹理)
+        self.render_scale = scale
+        if scale < 1.0 and self.name != "sdl2":
+            # 软件Renderer放大纹理同样由CPU逐像素完成，比直接按窗口分辨率绘制更慢
+            print("--render-scale needs a GPU-accelerated renderer, rendering at full resolution")
+            self.render_scale = 1.0
+        self.scale = 1.0  # 当前绘制目标相对窗口的缩放
+        self.game_rect = None
+        self.game_texture = None  # 内部渲染比例<1时的游戏区域渲染目标（预先分配）
+    
+    def upload(self, surface):
+        """把表面上传为纹理并计入上传字节数"""
+        self.upload_bytes += surface.get_width() * surface.get_height() * 4
+        return self.video.Texture.from_surface(self.renderer, surface)
+    
+    def _point(self, pos):
+        if self.scale == 1.0:
+            return int(pos[0]), int(pos[1])
+        return int((pos[0] - self.game_rect.x) * self.scale), int((pos[1] - self.game_rect.y) * self.scale)
+    
+    def _length(self, value):
+        return max(1, int(value * self.scale)) if value else 0
+    
+    def _rect(self, rect):
+        rect = pygame.Rect(rect)
+        if self.scale == 1.0:
+            return rect
+        x, y = self._point(rect.topleft)
+        return pygame.Rect(x, y, self._length(rect.width), self._length(rect.height))
+    
+    def begin_game_area(self, rect):
+        if self.render_scale >= 1.0:
+            return
+        self.game_rect = pygame.Rect(rect)
+        size = (max(1, int(self.game_rect.width * self.render_scale)), max(1, int(self.game_rect.height * self.render_scale)))
+        if self.game_texture is None or self.game_texture.get_rect().size != size:
+            self.game_texture = self.video.Texture(self.renderer, size, target=True)
+        self.renderer.target = self.game_texture
+        self.scale = self.render_scale
+    
+    def end_game_area(self):
+        if self.scale == 1.0:
+            return
+        # 放大由Renderer在合成时完成
+        self.renderer.target = None
+        self.scale = 1.0
+        self.game_texture.draw(dstrect=self.game_rect)
+    
+    def fill(self, color, rect=None):
+        self.renderer.draw_color = pygame.Color(color)
+        if rect is None:
+            self.renderer.clear()
+        else:
+            self.renderer.fill_rect(self._rect(rect))
+    
+    def rect(self, color, rect, width=0):
+        rect = self._rect(rect)
+        width = self._length(width)
+        self.renderer.draw_color = pygame.Color(color)
+        if width <= 0:
+            self.renderer.fill_rect(rect)
+            return
+        # 边框用四个矩形拼出
+        self.renderer.fill_rect((rect.x, rect.y, rect.width, width))
+        self.renderer.fill_rect((rect.x, rect.bottom - width, rect.width, width))
+        self.renderer.fill_rect((rect.x, rect.y, width, rect.height))
+        self.renderer.fill_rect((rect.right - width, rect.y, width, rect.height))
+    
+    def line(self, color, start, end, width=1):
+        self.renderer.draw_color = pygame.Color(color)
+        (x1, y1), (x2, y2) = self._point(start), self._point(end)
+        width = self._length(width)
+        if width > 1 and (x1 == x2 or y1 == y2):
+            # 水平/竖直粗线用矩形绘制（与pygame.draw.line的线宽方向一致）
+            if x1 == x2:
+                self.renderer.fill_rect((x1 - width // 2, min(y1, y2), width, abs(y2 - y1) + 1))
+            else:
+                self.renderer.fill_rect((min(x1, x2), y1 - width // 2, abs(x2 - x1) + 1, width))
+        else:
+            self.renderer.draw_line((x1, y1), (x2, y2))
+    
+    def _shape_texture(self, key, radius, draw):
+        texture = self.shape_cache.get(key)
+        if texture is None:
+            surface = pygame.Surface((radius * 2 + 1, radius * 2 + 1), pygame.SRCALPHA)
+            draw(surface, (radius, radius))
+            texture = self.upload(surface)
+            self.shape_cache[key] = texture
+        return texture
+    
+    def circle(self, color, center, radius, width=0):
+        center = self._point(center)
+        radius = self._length(radius)
+        width = self._length(width)
+        texture = self._shape_texture(("circle", color, radius, width), radius,
+                                      lambda surface, c: pygame.draw.circle(surface, color, c, radius, width))
+        texture.draw(dstrect=(int(center[0]) - radius, int(center[1]) - radius, radius * 2 + 1, radius * 2 + 1))
+    
+    def ball(self, color, center, radius):
+        center = self._point(center)
+        radius = self._length(radius)
+        
+        def draw(surface, c):
+            pygame.draw.circle(surface, color, c, radius)
+            pygame.draw.circle(surface, (0, 0, 0), c, radius, 1)
+        
+        texture = self._shape_texture(("ball", color, radius), radius, draw)
+        texture.draw(dstrect=(int(center[0]) - radius, int(center[1]) - radius, radius * 2 + 1, radius * 2 + 1))
+    
+    def text(self, font, text, color, pos, anchor="topleft", alpha=255):
+        texture = self.cached_text(font, text, color, self.upload)
+        rect = texture.get_rect(**{anchor: (int(pos[0]), int(pos[1]))})
+        if alpha < 255:
+            texture.alpha = alpha
+            texture.draw(dstrect=rect)
+            texture.alpha = 255
+        else:
+            texture.draw(dstrect=rect)
+        return rect
+    
+    def image(self, key, surface, rect, version=0):
+        """绘制表面（按key和version缓存纹理，缩放由Renderer完成）"""
+        cached = self.image_cache.get(key)
+        if cached is None or cached[0] != version:
+            cached = (version, self.upload(surface))
+            self.image_cache[key] = cached
+        cached[1].draw(dstrect=self._rect(rect))
+    
+    def frame_surface(self):
+        """本帧合成好的画面（从Renderer读回到预先分配的表面，需要在present之前调用）"""
+        if self.readback is None:
+            self.readback = pygame.Surface(self.size, 0, 32)
+        return self.renderer.to_surface(surface=self.readback)
+    
+    def present(self):
+        self.renderer.present()
+        self.end_frame()
+
+# 排行榜推送客户端（通过 --leaderboard 启用，未启用时为None）
+leaderboard_client = None
+station_name = socket.gethostname()
 
 class ClickEffect:
     def __init__(self, x, y, score_text, duration=1000):  # 1秒持续时间
@@ -46,9 +606,7 @@ class ClickEffect:
         self.score_text = score_text
         self.start_time = pygame.time.get_ticks()
         self.duration = duration
-        self.font = pygame.font.Font(None, 36)
-        # 缓存文本表面以提高性能
-        self.cached_text_surface = self.font.render(str(score_text), True, TEXT_COLOR)
+        self.font = get_font(get_layout(screen_width, screen_height).font_size(36))
         
     def is_finished(self):
         current_time = pygame.time.get_ticks()
@@ -68,22 +626,13 @@ class ClickEffect:
             alpha = int((remaining / 2000) * 255)
             return max(0, alpha)
     
-    def draw(self, surface):
+    def draw(self, renderer):
         alpha = self.get_alpha()
         if alpha <= 0:
             return
-            
-        # 使用缓存的文本表面以提高性能
-        if alpha < 255:
-            # 创建带透明度的副本
-            text_surface = self.cached_text_surface.copy()
-            text_surface.set_alpha(alpha)
-        else:
-            text_surface = self.cached_text_surface
         
-        # 居中显示在点击位置
-        text_rect = text_surface.get_rect(center=(int(self.x), int(self.y)))
-        surface.blit(text_surface, text_rect)
+        # 居中显示在点击位置（文字由渲染后端缓存）
+        renderer.text(self.font, str(self.score_text), TEXT_COLOR, (self.x, self.y), anchor="center", alpha=alpha)
 
 class Ball:
     def __init__(self, x, y, radius, color=BALL_COLOR):
@@ -91,15 +640,396 @@ class Ball:
         self.y = y
         self.radius = radius
         self.color = color
+        self.spawn_time = pygame.time.get_ticks()  # 生成时间（用于计算反应时间）
+    
+    def draw(self, renderer):
+        # 实心圆 + 黑色描边
+        renderer.ball(self.color, (self.x, self.y), self.radius)
+
+# 热力图叠加层的显示顺序（H键切换）
+HEATMAP_VIEWS = (None, "accuracy", "reaction")
+
+class HitHeatmap:
+    """
+    按网格统计的命中/失误/反应时间热力图
+    
+    每个方格的累计值保存在紧凑数组中，每次点击O(1)更新；叠加层和导出图片
+    直接由这些数组生成，不需要重新扫描历史记录。
+    """
+    def __init__(self, cols, rows, grid_size):
+        self.cols = cols
+        self.rows = rows
+        self.grid_size = grid_size
+        cell_count = cols * rows
+        self.hits = array('I', [0]) * cell_count  # 每格命中次数
+        self.misses = array('I', [0]) * cell_count  # 每格失误次数
+        self.reaction_sum = array('d', [0.0]) * cell_count  # 每格命中反应时间总和 (毫秒)
+        self.version = 0  # 每次更新+1，用于判断叠加层缓存是否过期
+        
+        self._overlay_cache = None
+        self._overlay_key = None
+    
+    def cell_index(self, x, y):
+        """坐标所在方格的下标，不在网格内时返回None"""
+        col = int(x // self.grid_size)
+        row = int(y // self.grid_size)
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            return row * self.cols + col
+        return None
+    
+    def record(self, x, y, hit, reaction_time=None):
+        """记录一次点击"""
+        index = self.cell_index(x, y)
+        if index is None:
+            return
+        if hit:
+            self.hits[index] += 1
+            if reaction_time is not None:
+                self.reaction_sum[index] += reaction_time
+        else:
+            self.misses[index] += 1
+        self.version += 1
+    
+    def merge(self, other):
+        """合并另一张相同网格的热力图"""
+        if (other.cols, other.rows) != (self.cols, self.rows):
+            return False
+        for i in range(len(self.hits)):
+            self.hits[i] += other.hits[i]
+            self.misses[i] += other.misses[i]
+            self.reaction_sum[i] += other.reaction_sum[i]
+        self.version += 1
+        return True
+    
+    def copy(self):
+        heatmap = HitHeatmap(self.cols, self.rows, self.grid_size)
+        heatmap.merge(self)
+        return heatmap
+    
+    def average_reaction_time(self, index):
+        """某一格的平均反应时间（毫秒）"""
+        return self.reaction_sum[index] / self.hits[index] if self.hits[index] else 0.0
+    
+    def to_dict(self):
+        return {
+            "cols": self.cols,
+            "rows": self.rows,
+            "hits": self.hits.tolist(),
+            "misses": self.misses.tolist(),
+            "reaction_sum": [round(v, 3) for v in self.reaction_sum],
+        }
+    
+    @classmethod
+    def from_dict(cls, data, grid_size):
+        heatmap = cls(data["cols"], data["rows"], grid_size)
+        cell_count = heatmap.cols * heatmap.rows
+        if len(data["hits"]) == cell_count and len(data["misses"]) == cell_count and len(data["reaction_sum"]) == cell_count:
+            heatmap.hits = array('I', data["hits"])
+            heatmap.misses = array('I', data["misses"])
+            heatmap.reaction_sum = array('d', data["reaction_sum"])
+        return heatmap
+    
+    def reaction_range(self):
+        """有命中的方格中最快和最慢的平均反应时间（毫秒），没有命中时返回None"""
+        averages = [self.average_reaction_time(i) for i in range(len(self.hits)) if self.hits[i]]
+        return (min(averages), max(averages)) if averages else None
+    
+    def render(self, view="accuracy"):
+        """
+        生成热力图叠加层，越不透明样本越多
+        
+        accuracy：绿色=命中为主，红色=失误为主；
+        reaction：按平均反应时间着色，绿色=本图中最快的方格，红色=最慢的方格（只统计命中）。
+        每格一个像素，由渲染后端放大到方格大小；数组未变化时直接返回缓存。
+        """
+        key = (self.version, view)
+        if self._overlay_key == key:
+            return self._overlay_cache
+        
+        cells = pygame.Surface((self.cols, self.rows), pygame.SRCALPHA)
+        reaction_range = self.reaction_range() if view == "reaction" else None
+        for index in range(self.cols * self.rows):
+            if view == "reaction":
+                count = self.hits[index]
+                if count == 0:
+                    continue
+                fastest, slowest = reaction_range
+                ratio = (self.average_reaction_time(index) - fastest) / (slowest - fastest) if slowest > fastest else 0.0
+            else:
+                count = self.hits[index] + self.misses[index]
+                if count == 0:
+                    continue
+                ratio = self.misses[index] / count
+            alpha = min(180, 40 + count * 10)
+            color = (int(255 * ratio), int(200 * (1 - ratio)), 0, alpha)
+            cells.set_at((index % self.cols, index // self.cols), color)
+        
+        self._overlay_cache = cells
+        self._overlay_key = key
+        return self._overlay_cache
+
+class TargetSchedule:
+    """
+    预生成的挑战目标序列（固定种子）
+    
+    开局前按 get_available_positions 的间距规则批量生成前 HEAD_SIZE 个目标，以方格下标存放在紧凑数组中；
+    游戏中生成小球只需把下标加一，相同种子和分辨率的训练机看到完全相同的序列。
+    生成时假设小球按出现顺序被击中（最早出现的最先消失）。
+    无尽模式用完开头部分后，每取一个目标顺带往后生成少量目标，放在长度有限的环形缓冲区中，
+    点击路径上不会出现整批生成，内存也不随时长增长。
+    """
+    HEAD_SIZE = 1024  # 开局前生成的目标数量（60秒一局远用不完）
+    LOOKAHEAD = 64  # 开头部分用完前开始往后生成，环形缓冲区最多保存的目标数
+    STEP = 2  # 每取一个目标往后生成的数量（大于每次消耗的数量，缓冲区不会被取空）
     
-    def draw(self, surface):
-        # 使用抗锯齿绘制圆形以改善渲染质量
-        pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), int(self.radius))
-        # 添加抗锯齿边缘
-        pygame.draw.circle(surface, (0, 0, 0), (int(self.x), int(self.y)), int(self.radius), 1)
+    def __init__(self, trainer, seed):
+        self.trainer = trainer
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.index = 0  # 下一个目标的序号
+        self.skipped = 0  # 因与同屏小球重叠而跳过的目标数
+        
+        # 生成序列时模拟的同屏小球和消失位置
+        self._live = deque()
+        self._vanished = deque(maxlen=20)
+        
+        self.head = array('H')  # 开头部分的目标方格下标 (row * cols + col)
+        self.ahead = deque()  # 开头部分之后已生成、尚未取出的目标（不超过 LOOKAHEAD 个）
+        self.exhausted = False  # 网格太小，无法继续生成
+        while len(self.head) < self.HEAD_SIZE and not self.exhausted:
+            cell = self._generate()
+            if cell is not None:
+                self.head.append(cell)
+        # 开头部分之后的生成状态，重新开始时恢复
+        self._snapshot = (self.rng.getstate(), list(self._live), list(self._vanished), self.exhausted)
+    
+    def _generate(self):
+        """按相同的随机数序列生成下一个目标，无法生成时返回None"""
+        if self.exhausted:
+            return None
+        trainer = self.trainer
+        if len(self._live) >= trainer.n:
+            self._vanished.append(self._live.popleft())
+        candidates = trainer.get_available_positions(list(self._live), self._vanished)
+        if not candidates:
+            candidates = trainer.get_relaxed_available_positions(list(self._live))
+        if not candidates:
+            self.exhausted = True
+            return None
+        x, y = self.rng.choice(candidates)
+        self._live.append((x, y))
+        return (y // trainer.grid_size) * trainer.cols + x // trainer.grid_size
+    
+    def generate_ahead(self, count):
+        """往环形缓冲区中补充最多count个目标"""
+        for _ in range(count):
+            if len(self.ahead) >= self.LOOKAHEAD:
+                return
+            cell = self._generate()
+            if cell is None:
+                return
+            self.ahead.append(cell)
+    
+    def reset(self):
+        """从头开始（重新开始同一挑战）"""
+        self.index = 0
+        self.skipped = 0
+        rng_state, live, vanished, exhausted = self._snapshot
+        self.rng.setstate(rng_state)
+        self._live = deque(live)
+        self._vanished = deque(vanished, maxlen=20)
+        self.exhausted = exhausted
+        self.ahead.clear()
+    
+    def _take(self):
+        """按顺序取出下一个目标的方格下标，没有时返回None"""
+        if self.index + self.LOOKAHEAD >= len(self.head):
+            # 接近或已用完开头部分：少量往后生成
+            self.generate_ahead(self.STEP)
+        if self.index < len(self.head):
+            cell = self.head[self.index]
+        elif self.ahead:
+            cell = self.ahead.popleft()
+        else:
+            return None
+        self.index += 1
+        return cell
+    
+    def next_position(self, ball_positions, max_attempts=64):
+        """
+        取出下一个目标的位置
+        
+        玩家没有按出现顺序击中小球时，预生成的位置可能与同屏小球重叠，此时跳过该目标。
+        """
+        trainer = self.trainer
+        min_distance = trainer.ball_radius * 2
+        for _ in range(max_attempts):
+            cell = self._take()
+            if cell is None:
+                return None
+            x = (cell % trainer.cols) * trainer.grid_size + trainer.grid_size // 2
+            y = (cell // trainer.cols) * trainer.grid_size + trainer.grid_size // 2
+            if all(math.hypot(x - ball_x, y - ball_y) >= min_distance for ball_x, ball_y in ball_positions):
+                return x, y
+            self.skipped += 1
+        return None
+
+class ClickTraceWriter:
+    """把每次点击按定长二进制记录追加写入轨迹文件（带缓冲，点击路径上只是内存拷贝）"""
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'wb', buffering=64 * 1024)
+        self.file.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION))
+    
+    def write(self, elapsed, x, y, hit, balls, score):
+        self.file.write(TRACE_RECORD.pack(
+            max(0, int(elapsed)), max(-32768, min(32767, int(x))), max(-32768, min(32767, int(y))),
+            1 if hit else 0, min(255, balls), max(-2**31, min(2**31 - 1, int(score)))))
+    
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+    
+    def discard(self):
+        """关闭并删除轨迹文件（本局未完成时）"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def read_trace(path, chunk_records=256):
+    """
+    逐块读取轨迹文件，逐条产出 (elapsed, x, y, hit, balls, score)
+    
+    每次只读入 chunk_records 条记录，内存占用与轨迹长度无关。
+    """
+    with open(path, 'rb') as f:
+        header = f.read(TRACE_HEADER.size)
+        if len(header) < TRACE_HEADER.size:
+            return
+        magic, version = TRACE_HEADER.unpack(header)
+        if magic != TRACE_MAGIC or version != TRACE_VERSION:
+            return
+        chunk_size = TRACE_RECORD.size * chunk_records
+        while True:
+            data = f.read(chunk_size)
+            usable = len(data) - len(data) % TRACE_RECORD.size
+            if usable <= 0:
+                return
+            yield from TRACE_RECORD.iter_unpack(data[:usable])
+
+class GhostTrace:
+    """
+    幽灵对手：按当前游戏时间回放最佳一局的点击轨迹
+    
+    轨迹从磁盘逐块解码，每帧只处理已到时间的记录，内存和每帧开销都与轨迹长度无关。
+    """
+    def __init__(self, path, marker_duration=300):
+        self.path = path
+        self.records = read_trace(path)
+        self.next_record = None
+        self.finished = False
+        self.score = 0
+        self.hits = 0
+        self.clicks = 0
+        self.marker_duration = marker_duration  # 幽灵命中标记显示时长 (毫秒)
+        self.recent_hits = deque(maxlen=8)  # 最近的幽灵命中 (elapsed, x, y)
+    
+    def advance(self, elapsed):
+        """推进到当前游戏时间（毫秒）"""
+        while not self.finished:
+            if self.next_record is None:
+                self.next_record = next(self.records, None)
+                if self.next_record is None:
+                    self.finished = True
+                    break
+            record_time, x, y, hit, balls, score = self.next_record
+            if record_time > elapsed:
+                break
+            self.next_record = None
+            self.clicks += 1
+            self.score = score
+            if hit:
+                self.hits += 1
+                self.recent_hits.append((record_time, x, y))
+    
+    def get_visible_hits(self, elapsed):
+        """需要显示标记的幽灵命中位置"""
+        return [(x, y) for hit_time, x, y in self.recent_hits if elapsed - hit_time <= self.marker_duration]
+    
+    def close(self):
+        self.records.close()
+
+class ClickIntervalStats:
+    """
+    正确点击间隔的流式统计（固定内存，每次更新O(1)）
+    
+    同时维护整局的累计平均值和最近 window 个间隔的滑动窗口（环形缓冲区 + 分桶直方图），
+    长时间的耐力训练中内存和每帧开销都不随时长增长。
+    """
+    def __init__(self, window=50, bin_width=50, bin_count=40):
+        self.count = 0  # 间隔数量
+        self.total = 0  # 间隔总和 (毫秒)
+        self.last_time = None  # 上一次正确点击的时间
+        
+        # 滑动窗口
+        self.window = deque(maxlen=window)
+        self.window_total = 0
+        self.bin_width = bin_width
+        self.histogram = [0] * (bin_count + 1)  # 最后一个桶收集所有超出范围的间隔
+    
+    def _bin(self, interval):
+        return min(int(interval // self.bin_width), len(self.histogram) - 1)
+    
+    def add(self, click_time):
+        """记录一次正确点击的时间"""
+        if self.last_time is not None:
+            interval = click_time - self.last_time
+            self.count += 1
+            self.total += interval
+            
+            # 窗口已满时先移除最旧的间隔
+            if len(self.window) == self.window.maxlen:
+                oldest = self.window[0]
+                self.window_total -= oldest
+                self.histogram[self._bin(oldest)] -= 1
+            self.window.append(interval)
+            self.window_total += interval
+            self.histogram[self._bin(interval)] += 1
+        self.last_time = click_time
+    
+    def average(self):
+        """整局平均间隔（毫秒）"""
+        if self.count == 0:
+            return 0.0
+        return round(self.total / self.count, 3)  # 保留3位小数
+    
+    def window_average(self):
+        """最近窗口内的平均间隔（毫秒）"""
+        if not self.window:
+            return 0.0
+        return round(self.window_total / len(self.window), 3)
+    
+    def window_percentile(self, q):
+        """最近窗口内间隔的近似分位数（按桶上界估计，毫秒）"""
+        if not self.window:
+            return 0.0
+        target = q * len(self.window)
+        seen = 0
+        for index, bin_count in enumerate(self.histogram):
+            seen += bin_count
+            if seen >= target:
+                if index == len(self.histogram) - 1:
+                    return float(max(self.window))
+                return float((index + 1) * self.bin_width)
+        return float(max(self.window))
 
 class AimTrainer:
-    def __init__(self, game_mode="mod_1", game_duration=60000):
+    def __init__(self, game_mode="mod_1", game_duration=60000, challenge_seed=None):
         self.game_mode = game_mode  # "mod_1" 或 "mod_2"
         
         """
@@ -109,49 +1039,45 @@ class AimTrainer:
         
         1. 通用变量 (两个模式都使用)
         """
-        self.game_duration = game_duration  # 游戏持续时间 (毫秒)
+        self.game_duration = game_duration  # 游戏持续时间 (毫秒)，None表示无尽模式
         self.n = 3  # 同时显示的小球数量
         self.C = 100  # 基础分数 (模式2和3为100分)
         self.history_file = "aim_trainer_history.json"  # 历史记录文件
-        self.panel_width = 250  # 信息面板宽度
-        self.panel_height = screen_height  # 信息面板高度
-        self.panel_x = screen_width - self.panel_width  # 信息面板X坐标
-        self.panel_y = 0  # 信息面板Y坐标
-        self.game_width = screen_width - self.panel_width  # 游戏区域宽度
-        self.game_height = screen_height  # 游戏区域高度
+        self.heatmap_file = "aim_trainer_heatmap.json"  # 热力图累计文件
+        
+        # 当前分辨率的布局（按分辨率缓存，同一分辨率只计算一次）
+        self.layout = get_layout(screen_width, screen_height)
+        self.panel_width = self.layout.panel_width  # 信息面板宽度
+        self.panel_height = self.layout.panel_height  # 信息面板高度
+        self.panel_x = self.layout.panel_x  # 信息面板X坐标
+        self.panel_y = self.layout.panel_y  # 信息面板Y坐标
+        self.game_width = self.layout.game_width  # 游戏区域宽度
+        self.game_height = self.layout.game_height  # 游戏区域高度
         
         # 字体相关
         pygame.font.init()
-        self.font_large = pygame.font.Font(None, 48)
-        self.font_medium = pygame.font.Font(None, 36)
-        self.font_small = pygame.font.Font(None, 24)
+        self.font_large = get_font(self.layout.font_size(48))
+        self.font_medium = get_font(self.layout.font_size(36))
+        self.font_small = get_font(self.layout.font_size(24))
         
         """
         2. 基于数学对应关系的变量 (通过基础变量和比例关系计算得出)
         """
-        # 基础网格大小 (两个模式共享)
-        self.base_grid_size = int(min(self.game_width, self.game_height) * 0.08)
-        
-        # 模式特定的比例参数
-        if self.game_mode == "mod_1":
-            self.ball_diameter_ratio = 1.0  # 模式1: 球体直径比例 (基准)
-            self.grid_ball_ratio = 1.5      # 模式1: 方格与球体直径比例
-        elif self.game_mode == "mod_2":
-            self.ball_diameter_ratio = 1.75 # 模式2: 球体直径是模式1的1.75倍
-            self.grid_ball_ratio = 1.3      # 模式2: 方格边长是球体直径的1.3倍
-        else:  # mod_3
-            self.ball_diameter_ratio = 1.75 # 模式3: 球体直径是模式1的1.75倍（复用模式2规则）
-            self.grid_ball_ratio = 1.3      # 模式3: 方格边长是球体直径的1.3倍（复用模式2规则）
-        
-        # 通过数学关系计算得出的实际值
-        self.base_ball_diameter = (self.base_grid_size // 2) * 2 - 4  # 基础球体直径
-        self.actual_ball_diameter = int(self.base_ball_diameter * self.ball_diameter_ratio)  # 实际球体直径
-        self.ball_radius = self.actual_ball_diameter // 2  # 实际球体半径
-        self.grid_size = int(self.actual_ball_diameter * self.grid_ball_ratio)  # 实际方格边长
-        
-        # 计算网格行列数
-        self.cols = self.game_width // self.grid_size
-        self.rows = self.game_height // self.grid_size
+        # 基础网格大小 (所有模式共享)
+        self.base_grid_size = self.layout.base_grid_size
+        self.base_ball_diameter = self.layout.base_ball_diameter  # 基础球体直径
+        
+        # 模式特定的比例参数和由此计算得出的实际值（见 MODE_RATIOS 和 Layout）
+        geometry = self.layout.mode_geometry[self.game_mode]
+        self.ball_diameter_ratio = geometry["ball_diameter_ratio"]  # 球体直径比例
+        self.grid_ball_ratio = geometry["grid_ball_ratio"]  # 方格与球体直径比例
+        self.actual_ball_diameter = geometry["actual_ball_diameter"]  # 实际球体直径
+        self.ball_radius = geometry["ball_radius"]  # 实际球体半径
+        self.grid_size = geometry["grid_size"]  # 实际方格边长
+        
+        # 网格行列数
+        self.cols = geometry["cols"]
+        self.rows = geometry["rows"]
         
         """
         3. 专用变量 (每个模式特有的变量和游戏状态)
@@ -167,13 +1093,13 @@ class AimTrainer:
         self.combo_count = 0  # 连击计数
         
         # 位置记录和生成规则 (模式特定)
-        self.last_ball_positions = []  # 记录最后消失的小球位置
+        self.last_ball_positions = deque(maxlen=20)  # 记录最后消失的小球位置（只保留最近20个）
         
-        # 点击效果
-        self.click_effects = []
+        # 点击效果（最多保留16个，最旧的自动移除）
+        self.click_effects = deque(maxlen=16)
         
-        # 点击时间记录
-        self.click_times = []
+        # 正确点击间隔统计（固定内存）
+        self.click_intervals = ClickIntervalStats()
         self.first_click_time = None  # 第一次点击的时间
         
         # 模式3特定变量
@@ -189,9 +1115,23 @@ class AimTrainer:
             # 背景板移动速度控制
             self.background_movable = True
         
+        # 挑战模式：固定种子的预生成目标序列（None表示随机生成）
+        self.challenge_seed = challenge_seed
+        self.schedule = TargetSchedule(self, challenge_seed) if challenge_seed is not None else None
+        
+        # 点击轨迹（用于幽灵对手回放）
+        self.trace_writer = None
+        self.ghost = None
+        self.show_ghost = True  # 幽灵对手开关（G键切换）
+        
         # 加载历史记录
         self.load_history()
         
+        # 热力图：按模式和网格尺寸分别累计（不同分辨率的网格不能合并）
+        self.heatmap_key = f"{self.game_mode}:{self.cols}x{self.rows}"
+        self.heatmap_history = self.load_heatmap()  # 以往所有局的累计
+        self.heatmap_view = None  # 热力图叠加层：None / "accuracy" / "reaction"（H键依次切换）
+        
         self.initialize_game()
         
         # 模式3特殊设置：隐藏光标
@@ -232,8 +1172,22 @@ class AimTrainer:
         
         return int(current_score)
     
-    def get_available_positions(self):
-        """获取可用的网格位置"""
+    def get_recent_positions(self, count, last_positions=None):
+        """获取最近消失的count个小球位置"""
+        if last_positions is None:
+            last_positions = self.last_ball_positions
+        if count <= 0:
+            return []
+        return list(itertools.islice(reversed(last_positions), count))
+    
+    def get_available_positions(self, ball_positions=None, last_positions=None):
+        """
+        获取可用的网格位置
+        
+        默认使用当前的小球和消失位置；预生成挑战序列时传入模拟的状态。
+        """
+        if ball_positions is None:
+            ball_positions = [(ball.x, ball.y) for ball in self.balls]
         available_positions = []
         
         if self.game_mode == "mod_1":
@@ -241,7 +1195,7 @@ class AimTrainer:
             start_row, end_row = 1, self.rows - 1
             start_col, end_col = 1, self.cols - 1
             # 记录n-1个最后消失的位置
-            positions_to_check = self.last_ball_positions[-(self.n-1):] if self.n > 1 else []
+            positions_to_check = self.get_recent_positions(self.n - 1, last_positions)
         elif self.game_mode == "mod_2":
             # 模式2：只在中间3x3区域（9个格子），最多3个小球
             center_row = self.rows // 2
@@ -251,7 +1205,7 @@ class AimTrainer:
             start_col = max(1, center_col - 1)
             end_col = min(self.cols - 1, center_col + 2)
             # 记录n+1个最后消失的位置
-            positions_to_check = self.last_ball_positions[-(self.n+1):]  # n=3, 所以记录4个位置
+            positions_to_check = self.get_recent_positions(self.n + 1, last_positions)  # n=3, 所以记录4个位置
         else:  # mod_3
             # 模式3：复用模式2的生成规则（中间3x3区域，最多3个小球）
             center_row = self.rows // 2
@@ -261,7 +1215,7 @@ class AimTrainer:
             start_col = max(1, center_col - 1)
             end_col = min(self.cols - 1, center_col + 2)
             # 记录n+1个最后消失的位置
-            positions_to_check = self.last_ball_positions[-(self.n+1):]  # n=3, 所以记录4个位置
+            positions_to_check = self.get_recent_positions(self.n + 1, last_positions)  # n=3, 所以记录4个位置
         
         # 生成网格位置
         for row in range(start_row, end_row):
@@ -276,8 +1230,8 @@ class AimTrainer:
                 
                 if self.game_mode == "mod_1":
                     # 模式1：检查与现有小球的距离
-                    for ball in self.balls:
-                        distance = math.sqrt((x - ball.x) ** 2 + (y - ball.y) ** 2)
+                    for ball_x, ball_y in ball_positions:
+                        distance = math.sqrt((x - ball_x) ** 2 + (y - ball_y) ** 2)
                         if distance < self.grid_size * 1.5:  # 间距至少1.5倍网格大小
                             too_close = True
                             break
@@ -285,8 +1239,8 @@ class AimTrainer:
                     # 模式2和模式3：由于球体变大了，需要确保不重叠
                     min_distance = self.ball_radius * 2 * 1.2  # 稍微增加安全距离
                     
-                    for ball in self.balls:
-                        distance = math.sqrt((x - ball.x) ** 2 + (y - ball.y) ** 2)
+                    for ball_x, ball_y in ball_positions:
+                        distance = math.sqrt((x - ball_x) ** 2 + (y - ball_y) ** 2)
                         if distance < min_distance:
                             too_close = True
                             break
@@ -315,9 +1269,11 @@ class AimTrainer:
         self.total_clicks = 0
         self.hit_clicks = 0
         self.combo_count = 0
-        self.last_ball_positions = []
-        self.click_effects = []
-        self.click_times = []
+        self.last_ball_positions.clear()
+        self.click_effects.clear()
+        self.click_intervals = ClickIntervalStats()
+        self.heatmap = HitHeatmap(self.cols, self.rows, self.grid_size)  # 本局
+        self.heatmap_all = self.heatmap_history.copy()  # 以往 + 本局，用于实时叠加显示
         self.first_click_time = None
         self.start_time = None  # 不在初始化时开始计时
         self.game_active = True
@@ -329,11 +1285,32 @@ class AimTrainer:
         else:
             pygame.mouse.set_visible(True)
         
+        # 幽灵对手：回放当前模式最佳一局的轨迹
+        if self.trace_writer is not None:
+            self.trace_writer.discard()
+            self.trace_writer = None
+        if self.ghost is not None:
+            self.ghost.close()
+        self.ghost = self.load_ghost()
+        
+        # 挑战模式从序列开头重新开始
+        if self.schedule is not None:
+            self.schedule.reset()
+        
         # 生成n个小球
         self.generate_balls(self.n)
     
     def generate_balls(self, count):
         """生成指定数量的小球"""
+        if self.schedule is not None:
+            # 挑战模式：按预生成序列依次取位置
+            for _ in range(count):
+                position = self.schedule.next_position([(ball.x, ball.y) for ball in self.balls])
+                if position is None:
+                    break
+                self.balls.append(Ball(position[0], position[1], self.ball_radius))
+            return
+        
         available_positions = self.get_available_positions()
         
         if not available_positions:
@@ -351,8 +1328,10 @@ class AimTrainer:
             ball = Ball(x, y, self.ball_radius)
             self.balls.append(ball)
     
-    def get_relaxed_available_positions(self):
+    def get_relaxed_available_positions(self, ball_positions=None):
         """获取放宽限制的可用位置（当严格限制下没有可用位置时）"""
+        if ball_positions is None:
+            ball_positions = [(ball.x, ball.y) for ball in self.balls]
         available_positions = []
         
         if self.game_mode == "mod_1":
@@ -378,8 +1357,8 @@ class AimTrainer:
                 too_close = False
                 if self.game_mode == "mod_1":
                     # 模式1使用原始规则
-                    for ball in self.balls:
-                        distance = math.sqrt((x - ball.x) ** 2 + (y - ball.y) ** 2)
+                    for ball_x, ball_y in ball_positions:
+                        distance = math.sqrt((x - ball_x) ** 2 + (y - ball_y) ** 2)
                         min_distance = self.ball_radius * 2 * 0.8
                         if distance < min_distance:
                             too_close = True
@@ -388,8 +1367,8 @@ class AimTrainer:
                     # 模式2和模式3使用更大的球体半径
                     min_distance = self.ball_radius * 2 * 1.0  # 放宽到1.0倍
                     
-                    for ball in self.balls:
-                        distance = math.sqrt((x - ball.x) ** 2 + (y - ball.y) ** 2)
+                    for ball_x, ball_y in ball_positions:
+                        distance = math.sqrt((x - ball_x) ** 2 + (y - ball_y) ** 2)
                         if distance < min_distance:
                             too_close = True
                             break
@@ -406,26 +1385,33 @@ class AimTrainer:
             self.offset_x = self.center_x - pos[0]  # 反向：鼠标向右移动，背景向左移动
             self.offset_y = self.center_y - pos[1]  # 反向：鼠标向下移动，背景向上移动
     
-    def handle_click(self, pos):
-        """处理点击事件"""
+    def handle_click(self, pos, timestamp=None):
+        """处理点击事件（timestamp 为输入后端提供的点击时间，默认取当前时间）"""
         if not self.game_active:
             return
         
         # 记录点击时间（用于平均间隔计算，但只记录正确点击）
-        current_time = pygame.time.get_ticks()
+        current_time = timestamp if timestamp is not None else pygame.time.get_ticks()
         
-        # 第一次点击时开始游戏计时
+        # 第一次点击时开始游戏计时，并开始记录点击轨迹
         if self.first_click_time is None:
             self.first_click_time = current_time
+            trace_path = os.path.join(TRACE_DIR, f"{datetime.now():%Y%m%d_%H%M%S_%f}_{self.game_mode}.trace")
+            try:
+                self.trace_writer = ClickTraceWriter(trace_path)
+            except OSError:
+                self.trace_writer = None
         if self.start_time is None:
             self.start_time = current_time
         
         # 检查是否点击在游戏区域内（不在面板上）
         if pos[0] >= self.game_width:
             # 错误点击，扣分
+            self.play_sound("miss")
             self.total_clicks += 1
             self.score -= 100  # 现在允许负分
             self.combo_count = 0  # 重置连击计数
+            self.record_trace(current_time, pos[0], pos[1], False)
             return
         
         self.total_clicks += 1
@@ -455,18 +1441,21 @@ class AimTrainer:
                 
                 # 记录小球消失的位置（原始位置）
                 self.last_ball_positions.append((original_x, original_y))
-                if len(self.last_ball_positions) > 20:  # 只保留最近20个位置
-                    self.last_ball_positions.pop(0)
+                self.record_heatmap(original_x, original_y, True, current_time - clicked_ball.spawn_time)
                 
                 self.hit_clicks += 1
                 
-                # 只有正确点击才记录到click_times用于间隔计算
-                self.click_times.append(current_time)
+                # 只有正确点击才记录到间隔统计
+                self.click_intervals.add(current_time)
                 
                 # 计算当前分数（根据连击数和当前同屏小球数量）
                 current_ball_score = self.calculate_current_ball_score()
                 self.score += current_ball_score
                 
+                # 命中音效（这次命中达到连击阈值时播放连击音效）
+                self.play_sound("combo" if (self.combo_count + 1) % self.get_combo_threshold() == 0 else "hit")
+                self.record_trace(current_time, original_x, original_y, True)
+                
                 # 模式3不创建点击效果
                 if self.game_mode != "mod_3":
                     # 创建点击效果（在移动后的位置显示）
@@ -482,8 +1471,11 @@ class AimTrainer:
                 self.generate_balls(1)
             else:
                 # 点击空白区域或中心点不在任何小球上，扣分
+                self.play_sound("miss")
+                self.record_heatmap(self.center_x - self.offset_x, self.center_y - self.offset_y, False)
                 self.score -= 100  # 允许负分
                 self.combo_count = 0  # 重置连击计数
+                self.record_trace(current_time, self.center_x - self.offset_x, self.center_y - self.offset_y, False)
         else:
             # 模式1和模式2：原始点击逻辑
             clicked_ball = None
@@ -501,18 +1493,21 @@ class AimTrainer:
                 
                 # 记录小球消失的位置
                 self.last_ball_positions.append((clicked_ball.x, clicked_ball.y))
-                if len(self.last_ball_positions) > 20:  # 只保留最近20个位置
-                    self.last_ball_positions.pop(0)
+                self.record_heatmap(clicked_ball.x, clicked_ball.y, True, current_time - clicked_ball.spawn_time)
                 
                 self.hit_clicks += 1
                 
-                # 只有正确点击才记录到click_times用于间隔计算
-                self.click_times.append(current_time)
+                # 只有正确点击才记录到间隔统计
+                self.click_intervals.add(current_time)
                 
                 # 计算当前分数（根据连击数和当前同屏小球数量）
                 current_ball_score = self.calculate_current_ball_score()
                 self.score += current_ball_score
                 
+                # 命中音效（这次命中达到连击阈值时播放连击音效）
+                self.play_sound("combo" if (self.combo_count + 1) % self.get_combo_threshold() == 0 else "hit")
+                self.record_trace(current_time, clicked_ball.x, clicked_ball.y, True)
+                
                 # 模式3不创建点击效果
                 if self.game_mode != "mod_3":
                     # 创建点击效果
@@ -526,24 +1521,62 @@ class AimTrainer:
                 self.generate_balls(1)
             else:
                 # 点击空白区域，扣分
+                self.play_sound("miss")
+                self.record_heatmap(pos[0], pos[1], False)
                 self.score -= 100  # 允许负分
                 self.combo_count = 0  # 重置连击计数
+                self.record_trace(current_time, pos[0], pos[1], False)
+    
+    def play_sound(self, name):
+        """播放点击音效（未启用音效时忽略）"""
+        if sound_bank is not None:
+            sound_bank.play(name)
+    
+    def record_trace(self, current_time, x, y, hit):
+        """把一次点击追加到轨迹文件（同屏小球数为计分时的数量）"""
+        if self.trace_writer is not None:
+            self.trace_writer.write(current_time - self.first_click_time, x, y, hit, len(self.balls), self.score)
+    
+    def is_comparable(self, record):
+        """历史记录是否与本局可比：相同模式，且同为限时或同为无尽模式"""
+        return (record.get('game_mode', 'mod_1') == self.game_mode
+                and bool(record.get('endless', False)) == self.is_endless())
+    
+    def load_ghost(self):
+        """找到可比的（及相同挑战种子）最高分且轨迹文件仍存在的一局"""
+        best = None
+        for record in self.history:
+            if not self.is_comparable(record) or record.get('challenge_seed') != self.challenge_seed:
+                continue
+            trace_file = record.get('trace_file')
+            if not trace_file or not os.path.exists(trace_file):
+                continue
+            if best is None or record['score'] > best['score']:
+                best = record
+        return GhostTrace(best['trace_file']) if best else None
+    
+    def abandon(self):
+        """放弃未完成的一局（删除未完成的轨迹）"""
+        if self.trace_writer is not None:
+            self.trace_writer.discard()
+            self.trace_writer = None
+        if self.ghost is not None:
+            self.ghost.close()
+            self.ghost = None
+    
+    def update_ghost(self):
+        """按当前游戏时间推进幽灵对手"""
+        if self.ghost is not None and self.game_active and self.first_click_time is not None:
+            self.ghost.advance(self.get_time_elapsed())
+    
+    def record_heatmap(self, x, y, hit, reaction_time=None):
+        """把一次点击计入本局和累计热力图"""
+        self.heatmap.record(x, y, hit, reaction_time)
+        self.heatmap_all.record(x, y, hit, reaction_time)
     
     def calculate_average_click_interval(self):
         """计算平均两次正确点击的时间间隔（毫秒）"""
-        if len(self.click_times) < 2:
-            return 0.0
-        
-        # 计算相邻点击的时间间隔
-        intervals = []
-        for i in range(1, len(self.click_times)):
-            interval = self.click_times[i] - self.click_times[i-1]
-            intervals.append(interval)
-        
-        if intervals:
-            avg_interval = sum(intervals) / len(intervals)
-            return round(avg_interval, 3)  # 保留3位小数
-        return 0.0
+        return self.click_intervals.average()
     
     def calculate_score_display(self):
         """计算用于显示的分数（游戏结束后保持不变）"""
@@ -556,6 +1589,13 @@ class AimTrainer:
         if self.start_time is None or self.total_clicks == 0:
             return
         
+        # 结束轨迹记录
+        trace_file = None
+        if self.trace_writer is not None:
+            self.trace_writer.close()
+            trace_file = self.trace_writer.path
+            self.trace_writer = None
+        
         result = {
             "timestamp": datetime.now().isoformat(),
             "score": self.score,
@@ -566,7 +1606,10 @@ class AimTrainer:
             "max_combo": self.combo_count,
             "max_balls": self.n,
             "avg_click_interval": self.calculate_average_click_interval(),
-            "game_mode": self.game_mode
+            "game_mode": self.game_mode,
+            "endless": self.is_endless(),
+            "challenge_seed": self.challenge_seed,
+            "trace_file": trace_file
         }
         
         history = []
@@ -579,11 +1622,26 @@ class AimTrainer:
         
         history.append(result)
         
-        # 只保留最近100条记录
+        # 只保留最近100条记录，删除被移除记录的轨迹文件
+        for record in history[:-100]:
+            if record.get('trace_file') and os.path.exists(record['trace_file']):
+                try:
+                    os.remove(record['trace_file'])
+                except OSError:
+                    pass
         history = history[-100:]
         
         with open(self.history_file, 'w', encoding='utf-8') as f:
             json.dump(history, f, ensure_ascii=False, indent=2)
+        self.history = history
+        
+        # 本局热力图并入累计
+        self.heatmap_history.merge(self.heatmap)
+        self.save_heatmap()
+        
+        # 推送到局域网排行榜（只入队，不等待网络I/O）
+        if leaderboard_client is not None:
+            leaderboard_client.submit(dict(result, station=station_name))
     
     def load_history(self):
         """加载历史记录"""
@@ -595,43 +1653,107 @@ class AimTrainer:
             except:
                 self.history = []
     
+    def load_heatmap(self):
+        """加载当前模式和网格尺寸的累计热力图"""
+        if os.path.exists(self.heatmap_file):
+            try:
+                with open(self.heatmap_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if self.heatmap_key in data:
+                    return HitHeatmap.from_dict(data[self.heatmap_key], self.grid_size)
+            except:
+                pass
+        return HitHeatmap(self.cols, self.rows, self.grid_size)
+    
+    def save_heatmap(self):
+        """保存累计热力图（其他模式和网格尺寸的数据保持不变）"""
+        data = {}
+        if os.path.exists(self.heatmap_file):
+            try:
+                with open(self.heatmap_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except:
+                data = {}
+        data[self.heatmap_key] = self.heatmap_history.to_dict()
+        with open(self.heatmap_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+    
+    def export_heatmap(self):
+        """把当前热力图（以往 + 本局）导出为命中率和反应时间两张PNG图片，返回文件路径列表"""
+        paths = []
+        size = (self.cols * self.grid_size, self.rows * self.grid_size)
+        for view, path in (("accuracy", f"aim_trainer_heatmap_{self.game_mode}.png"),
+                           ("reaction", f"aim_trainer_heatmap_{self.game_mode}_reaction.png")):
+            image = pygame.Surface(size)
+            image.fill(BACKGROUND_COLOR)
+            image.blit(pygame.transform.scale(self.heatmap_all.render(view), size), (0, 0))
+            if view == "reaction":
+                # 每个有命中的方格标出平均反应时间 (毫秒)
+                for index in range(self.cols * self.rows):
+                    if self.heatmap_all.hits[index]:
+                        cell = pygame.Rect((index % self.cols) * self.grid_size, (index // self.cols) * self.grid_size,
+                                           self.grid_size, self.grid_size)
+                        label = self.font_small.render(f"{self.heatmap_all.average_reaction_time(index):.0f}", True, TEXT_COLOR)
+                        image.blit(label, label.get_rect(center=cell.center))
+            pygame.image.save(image, path)
+            paths.append(path)
+        return paths
+    
     def get_statistics(self):
         """获取统计信息"""
-        # 分别统计不同模式的历史记录
-        mode_history = [r for r in self.history if r.get('game_mode', 'mod_1') == self.game_mode]
+        # 分别统计不同模式的历史记录（无尽模式和限时模式分开统计）
+        mode_history = [r for r in self.history if self.is_comparable(r)]
+        label = f"{self.game_mode} endless" if self.is_endless() else self.game_mode
         
         if not mode_history:
-            return f"{self.game_mode}: No history"
+            return f"{label}: No history"
         
         scores = [r['score'] for r in mode_history]
         avg_score = sum(scores) / len(scores)
         best_score = max(scores)
         total_games = len(mode_history)
         
-        return f"{self.game_mode}: G:{total_games} Avg:{int(avg_score)} Best:{best_score}"
+        return f"{label}: G:{total_games} Avg:{int(avg_score)} Best:{best_score}"
+    
+    def is_endless(self):
+        """是否为无尽模式（没有时间限制）"""
+        return self.game_duration is None
+    
+    def get_time_elapsed(self):
+        """从第一次点击开始计算的游戏时间（毫秒）"""
+        current_time = pygame.time.get_ticks()
+        if self.first_click_time is not None:
+            return current_time - self.first_click_time
+        return current_time - (self.start_time or current_time)
+    
+    def is_animating(self):
+        """画面是否在持续变化（计时中或有点击效果在淡出），否则只需在输入时重绘"""
+        if self.game_active and self.start_time is not None:
+            return True
+        return len(self.click_effects) > 0
+    
+    def end_game(self):
+        """结束游戏并保存结果"""
+        if not self.game_active:
+            return
+        self.game_active = False
+        self.game_end_time = pygame.time.get_ticks()
+        self.final_score = self.score  # 保存最终分数
+        self.save_result()
+        if self.ghost is not None:
+            self.ghost.close()
+        
+        # 游戏结束时恢复光标显示
+        pygame.mouse.set_visible(True)
     
     def check_game_end(self):
         """检查游戏是否应该结束"""
-        if not self.game_active:
+        if not self.game_active or self.is_endless():
             return False
         
-        current_time = pygame.time.get_ticks()
-        # 从第一次点击开始计算游戏时间
-        if self.first_click_time is not None:
-            time_elapsed = current_time - self.first_click_time
-        else:
-            time_elapsed = current_time - (self.start_time or current_time)
-        
         # 游戏时间到达指定时间后结束
-        if time_elapsed >= self.game_duration:
-            self.game_active = False
-            self.game_end_time = current_time
-            self.final_score = self.score  # 保存最终分数
-            self.save_result()
-            
-            # 游戏结束时恢复光标显示
-            pygame.mouse.set_visible(True)
-            
+        if self.get_time_elapsed() >= self.game_duration:
+            self.end_game()
             return True
         
         return False
@@ -640,147 +1762,158 @@ class AimTrainer:
         """绘制信息面板"""
         # 绘制面板背景
         panel_rect = pygame.Rect(self.panel_x, self.panel_y, self.panel_width, self.panel_height)
-        pygame.draw.rect(screen, PANEL_COLOR, panel_rect)
-        pygame.draw.line(screen, TEXT_COLOR, (self.panel_x, 0), (self.panel_x, screen_height), 2)
+        backend.fill(PANEL_COLOR, panel_rect)
+        backend.line(TEXT_COLOR, (self.panel_x, 0), (self.panel_x, self.panel_height), 2)
         
         # 绘制信息 - 使用新颜色
-        y_offset = 20
-        score_text = self.font_medium.render(f"Score: {self.calculate_score_display()}", True, TEXT_COLOR)
-        screen.blit(score_text, (self.panel_x + 10, y_offset))
+        text_x = self.panel_x + self.layout.panel_padding
+        line_height = self.layout.line_height
+        y_offset = line_height // 2
+        backend.text(self.font_medium, f"Score: {self.calculate_score_display()}", TEXT_COLOR, (text_x, y_offset))
         
-        y_offset += 40
+        y_offset += line_height
         accuracy = self.hit_clicks / self.total_clicks if self.total_clicks > 0 else 0
-        accuracy_text = self.font_medium.render(f"Accuracy: {accuracy:.2%}", True, TEXT_COLOR)
-        screen.blit(accuracy_text, (self.panel_x + 10, y_offset))
+        backend.text(self.font_medium, f"Accuracy: {accuracy:.2%}", TEXT_COLOR, (text_x, y_offset))
         
-        y_offset += 40
-        clicks_text = self.font_medium.render(f"Clicks: {self.hit_clicks}/{self.total_clicks}", True, TEXT_COLOR)
-        screen.blit(clicks_text, (self.panel_x + 10, y_offset))
+        y_offset += line_height
+        backend.text(self.font_medium, f"Clicks: {self.hit_clicks}/{self.total_clicks}", TEXT_COLOR, (text_x, y_offset))
         
-        y_offset += 40
-        combo_text = self.font_medium.render(f"Combo: {self.combo_count}", True, TEXT_COLOR)
-        screen.blit(combo_text, (self.panel_x + 10, y_offset))
+        y_offset += line_height
+        backend.text(self.font_medium, f"Combo: {self.combo_count}", TEXT_COLOR, (text_x, y_offset))
         
-        y_offset += 40
+        y_offset += line_height
         # 显示当前小球的分数和连击参数
         current_ball_score = self.calculate_current_ball_score()
         combo_threshold = self.get_combo_threshold()
         combo_bonus = self.get_combo_bonus()
-        ball_score_text = self.font_medium.render(f"Ball: {current_ball_score} (T:{combo_threshold},B:{combo_bonus})", True, TEXT_COLOR)
-        screen.blit(ball_score_text, (self.panel_x + 10, y_offset))
+        backend.text(self.font_medium, f"Ball: {current_ball_score} (T:{combo_threshold},B:{combo_bonus})", TEXT_COLOR, (text_x, y_offset))
         
         # 显示当前同屏小球数
-        y_offset += 40
-        current_balls_text = self.font_medium.render(f"Balls: {len(self.balls)}/{self.n}", True, TEXT_COLOR)
-        screen.blit(current_balls_text, (self.panel_x + 10, y_offset))
+        y_offset += line_height
+        backend.text(self.font_medium, f"Balls: {len(self.balls)}/{self.n}", TEXT_COLOR, (text_x, y_offset))
         
         # 显示平均点击间隔
-        if len(self.click_times) >= 2:
-            y_offset += 40
+        if self.click_intervals.count >= 1:
+            y_offset += line_height
             avg_interval = self.calculate_average_click_interval()
-            interval_text = self.font_medium.render(f"Int(ms): {avg_interval:.3f}", True, TEXT_COLOR)
-            screen.blit(interval_text, (self.panel_x + 10, y_offset))
+            backend.text(self.font_medium, f"Int(ms): {avg_interval:.3f}", TEXT_COLOR, (text_x, y_offset))
+            
+            # 无尽模式额外显示最近窗口的平均间隔和P90
+            if self.is_endless():
+                y_offset += line_height
+                backend.text(self.font_medium,
+                             f"Last{len(self.click_intervals.window)}: {self.click_intervals.window_average():.0f}"
+                             f"/P90 {self.click_intervals.window_percentile(0.9):.0f}", TEXT_COLOR, (text_x, y_offset))
         
         # 显示当前模式
-        y_offset += 40
-        mode_text = self.font_medium.render(f"Mode: {self.game_mode}", True, TEXT_COLOR)
-        screen.blit(mode_text, (self.panel_x + 10, y_offset))
-        
-        # 显示剩余时间
+        y_offset += line_height
+        backend.text(self.font_medium, f"Mode: {self.game_mode}", TEXT_COLOR, (text_x, y_offset))
+        
+        # 幽灵对手：显示幽灵分数和实时分差
+        if self.ghost is not None and self.show_ghost:
+            y_offset += line_height
+            delta = self.score - self.ghost.score
+            backend.text(self.font_medium, f"Ghost: {self.ghost.score} ({delta:+})", TEXT_COLOR if delta >= 0 else RED, (text_x, y_offset))
+        
+        # 挑战模式显示种子和跳过的目标数
+        if self.schedule is not None:
+            y_offset += line_height
+            backend.text(self.font_medium, f"Seed: {self.challenge_seed} (S:{self.schedule.skipped})", TEXT_COLOR, (text_x, y_offset))
+        
+        # 反应时间热力图的图例：绿色和红色对应的平均反应时间
+        if self.heatmap_view == "reaction":
+            reaction_range = self.heatmap_all.reaction_range()
+            y_offset += line_height
+            legend = f"RT map: {reaction_range[0]:.0f}-{reaction_range[1]:.0f}ms" if reaction_range else "RT map: no hits"
+            backend.text(self.font_small, legend, TEXT_COLOR, (text_x, y_offset))
+        
+        # 显示帧时间和音频延迟
+        y_offset += line_height
+        audio_latency = sound_bank.average_latency() if sound_bank is not None else 0.0
+        backend.text(self.font_small, f"Frame {frame_timer.average():.1f}ms  Audio {audio_latency:.1f}ms",
+                     TEXT_COLOR, (text_x, y_offset))
+        
+        # 显示渲染后端的每帧CPU时间和上传量
+        y_offset += line_height // 2
+        backend.text(self.font_small, f"CPU {backend.average_cpu_time():.1f}ms  Upload {backend.average_upload_bytes() / 1024:.0f}KB",
+                     TEXT_COLOR, (text_x, y_offset))
+        
+        # 录制中显示已录帧数、丢帧数和录制开销
+        if frame_recorder is not None:
+            y_offset += line_height // 2
+            backend.text(self.font_small, f"Rec {frame_recorder.captured_count}  Drop {frame_recorder.dropped_count}  "
+                         f"{frame_recorder.average_overhead():.1f}ms", TEXT_COLOR, (text_x, y_offset))
+        
+        # 显示剩余时间（无尽模式显示已用时间）
         if self.start_time is not None and self.game_active:
-            y_offset += 40
-            current_time = pygame.time.get_ticks()
-            # 从第一次点击开始计算剩余时间
-            if self.first_click_time is not None:
-                time_elapsed = current_time - self.first_click_time
+            y_offset += line_height
+            # 从第一次点击开始计算时间
+            time_elapsed = self.get_time_elapsed()
+            if self.is_endless():
+                minutes, seconds = divmod(time_elapsed // 1000, 60)
+                time_text = f"Time: {minutes}:{seconds:02d}"
             else:
-                time_elapsed = current_time - self.start_time
-            remaining_time = max(0, self.game_duration - time_elapsed)
-            remaining_seconds = remaining_time / 1000.0
-            time_text = self.font_medium.render(f"Time: {remaining_seconds:.1f}s", True, TEXT_COLOR)
-            screen.blit(time_text, (self.panel_x + 10, y_offset))
-        elif not self.game_active:
-            y_offset += 40
-            time_text = self.font_medium.render("Time: 0.0s", True, TEXT_COLOR)
-            screen.blit(time_text, (self.panel_x + 10, y_offset))
+                remaining_time = max(0, self.game_duration - time_elapsed)
+                remaining_seconds = remaining_time / 1000.0
+                time_text = f"Time: {remaining_seconds:.1f}s"
+            backend.text(self.font_medium, time_text, TEXT_COLOR, (text_x, y_offset))
+        elif not self.game_active and not self.is_endless():
+            y_offset += line_height
+            backend.text(self.font_medium, "Time: 0.0s", TEXT_COLOR, (text_x, y_offset))
         
         # 绘制操作提示
-        y_offset = self.game_height - 80
-        instruction_text = self.font_small.render("Click red balls", True, TEXT_COLOR)
-        screen.blit(instruction_text, (self.panel_x + 10, y_offset))
+        y_offset = self.game_height - 2 * line_height
+        backend.text(self.font_small, "Click red balls", TEXT_COLOR, (text_x, y_offset))
         
         # 绘制统计信息
-        y_offset = self.game_height - 40
-        stats_text = self.font_small.render(self.get_statistics(), True, TEXT_COLOR)
-        screen.blit(stats_text, (self.panel_x + 10, y_offset))
+        y_offset = self.game_height - line_height
+        backend.text(self.font_small, self.get_statistics(), TEXT_COLOR, (text_x, y_offset))
     
     def draw(self):
         """绘制游戏界面"""
-        # 创建一个临时表面用于双缓冲
-        game_surface = pygame.Surface((self.game_width, self.game_height))
+        # 游戏区域（软件后端在内部渲染比例<1时以较低分辨率绘制后放大）
+        game_rect = pygame.Rect(0, 0, self.game_width, self.game_height)
+        backend.begin_game_area(game_rect)
         
         # 绘制游戏区域背景
-        game_rect = pygame.Rect(0, 0, self.game_width, self.game_height)
-        pygame.draw.rect(game_surface, BACKGROUND_COLOR, game_rect)
+        backend.fill(BACKGROUND_COLOR, game_rect)
         
         # 绘制中心标记（模式3用，也可以用于其他模式参考）
         if self.game_mode == "mod_3":
             # 绘制中心十字标记
             center_x = self.center_x
             center_y = self.center_y
-            pygame.draw.line(game_surface, (255, 0, 0), (center_x - 20, center_y), (center_x + 20, center_y), 2)
-            pygame.draw.line(game_surface, (255, 0, 0), (center_x, center_y - 20), (center_x, center_y + 20), 2)
+            backend.line((255, 0, 0), (center_x - 20, center_y), (center_x + 20, center_y), 2)
+            backend.line((255, 0, 0), (center_x, center_y - 20), (center_x, center_y + 20), 2)
         
         # 绘制小球（游戏结束后继续显示剩余小球，模式3需要应用偏移）
+        offset_x = self.offset_x if self.game_mode == "mod_3" else 0
+        offset_y = self.offset_y if self.game_mode == "mod_3" else 0
+        
+        # 热力图叠加层（画在小球下面，数组未变化时使用缓存）
+        if self.heatmap_view is not None:
+            overlay_rect = (offset_x, offset_y, self.cols * self.grid_size, self.rows * self.grid_size)
+            backend.image(f"heatmap_{self.heatmap_view}", self.heatmap_all.render(self.heatmap_view),
+                          overlay_rect, self.heatmap_all.version)
+        
         for ball in self.balls:
-            if self.game_mode == "mod_3":
-                # 模式3：绘制移动后的位置 - 直接计算，避免创建临时对象
-                x = int(ball.x + self.offset_x)
-                y = int(ball.y + self.offset_y)
-                pygame.draw.circle(game_surface, ball.color, (x, y), int(ball.radius))
-                # 添加抗锯齿边缘
-                pygame.draw.circle(game_surface, (0, 0, 0), (x, y), int(ball.radius), 1)
-            else:
-                # 模式1和2：正常绘制
-                pygame.draw.circle(game_surface, ball.color, (int(ball.x), int(ball.y)), int(ball.radius))
-                # 添加抗锯齿边缘
-                pygame.draw.circle(game_surface, (0, 0, 0), (int(ball.x), int(ball.y)), int(ball.radius), 1)
-        
-        # 绘制点击效果（模式3需要应用偏移）
-        for effect in self.click_effects[:]:
-            if self.game_mode == "mod_3":
-                # 模式3：调整点击效果位置 - 直接计算，避免创建临时对象
-                original_x = effect.x - (getattr(self, 'offset_x', 0) if hasattr(self, 'offset_x') else 0)
-                original_y = effect.y - (getattr(self, 'offset_y', 0) if hasattr(self, 'offset_y') else 0)
-                # 直接计算显示位置
-                display_x = int(original_x + self.offset_x)
-                display_y = int(original_y + self.offset_y)
-                alpha = effect.get_alpha()
-                if alpha > 0:
-                    # 创建文本表面
-                    text_surface = effect.font.render(str(effect.score_text), True, TEXT_COLOR)
-                    if alpha < 255:
-                        text_surface.set_alpha(alpha)
-                    # 居中显示在点击位置
-                    text_rect = text_surface.get_rect(center=(display_x, display_y))
-                    game_surface.blit(text_surface, text_rect)
-            else:
-                alpha = effect.get_alpha()
-                if alpha > 0:
-                    text_surface = effect.font.render(str(effect.score_text), True, TEXT_COLOR)
-                    if alpha < 255:
-                        text_surface.set_alpha(alpha)
-                    # 居中显示在点击位置
-                    text_rect = text_surface.get_rect(center=(int(effect.x), int(effect.y)))
-                    game_surface.blit(text_surface, text_rect)
-            
+            # 直接计算绘制位置，避免创建临时对象
+            backend.ball(ball.color, (ball.x + offset_x, ball.y + offset_y), ball.radius)
+        
+        # 幽灵命中标记（空心圆）
+        if self.ghost is not None and self.show_ghost and self.first_click_time is not None:
+            for ghost_x, ghost_y in self.ghost.get_visible_hits(self.get_time_elapsed()):
+                backend.circle(GHOST_COLOR, (ghost_x + offset_x, ghost_y + offset_y), self.ball_radius, 2)
+        
+        backend.end_game_area()
+        
+        # 绘制点击效果（按窗口分辨率绘制，保持文字清晰）
+        for effect in list(self.click_effects):
+            effect.draw(backend)
             if effect.is_finished():
                 self.click_effects.remove(effect)
         
-        # 将游戏表面绘制到屏幕上
-        screen.blit(game_surface, (0, 0))
-        
-        # 绘制信息面板（直接绘制到主屏幕）
+        # 绘制信息面板
         self.draw_info_panel()
         
         # 绘制游戏结束提示
@@ -788,93 +1921,68 @@ class AimTrainer:
             # 在游戏区域中央显示结束信息
             center_x = self.game_width // 2
             center_y = self.game_height // 2
+            text_gap = self.layout.line_height * 3 // 4
             
-            game_over_text = self.font_large.render("Game Over!", True, RED)
-            screen.blit(game_over_text, (center_x - game_over_text.get_width()//2, center_y - 30))
-            
-            restart_text = self.font_medium.render("Click to restart", True, TEXT_COLOR)
-            screen.blit(restart_text, (center_x - restart_text.get_width()//2, center_y + 30))
+            backend.text(self.font_large, "Game Over!", RED, (center_x, center_y - text_gap), anchor="midtop")
+            backend.text(self.font_medium, "Click to restart", TEXT_COLOR, (center_x, center_y + text_gap), anchor="midtop")
 
 class ModeSelection:
     def __init__(self):
-        self.font_large = pygame.font.Font(None, 72)
-        self.font_medium = pygame.font.Font(None, 36)
-        self.font_small = pygame.font.Font(None, 24)
+        self.layout = get_layout(screen_width, screen_height)
+        self.font_large = get_font(self.layout.font_size(72))
+        self.font_medium = get_font(self.layout.font_size(36))
+        self.font_small = get_font(self.layout.font_size(24))
         
-        # 按钮设置 - 三个模式水平排列
-        center_x = screen_width // 2
-        button_width = 120
-        button_height = 60
-        spacing = 150  # 按钮间距
+        # 按钮设置 - 三个模式水平排列（位置见 Layout.mode_buttons）
+        self.mod1_button = pygame.Rect(self.layout.mode_buttons[0])
+        self.mod2_button = pygame.Rect(self.layout.mode_buttons[1])
+        self.mod3_button = pygame.Rect(self.layout.mode_buttons[2])
+        self.desc_gap = int(30 * self.layout.ui_scale)  # 模式说明与按钮的间距
         
-        # 计算三个按钮的位置，使它们居中
-        total_width = 3 * button_width + 2 * spacing
-        start_x = center_x - total_width // 2
+        # 无尽模式开关（开启后不限时间，按ESC结束并保存）
+        self.endless_button = pygame.Rect(self.layout.endless_button)
+        self.endless = False
         
-        self.mod1_button = pygame.Rect(start_x, screen_height // 2 - 50, button_width, button_height)
-        self.mod2_button = pygame.Rect(start_x + button_width + spacing, screen_height // 2 - 50, button_width, button_height)
-        self.mod3_button = pygame.Rect(start_x + 2 * (button_width + spacing), screen_height // 2 - 50, button_width, button_height)
+        # 当前悬停的按钮（用于判断鼠标移动后是否需要重绘）
+        self.hovered_button = None
         
     def draw(self):
         """绘制模式选择界面"""
         # 清空屏幕
-        screen.fill(BACKGROUND_COLOR)
+        backend.fill(BACKGROUND_COLOR)
         
         # 标题
-        title_text = self.font_large.render("Aim Trainer", True, TEXT_COLOR)
-        title_rect = title_text.get_rect(center=(screen_width // 2, screen_height // 4))
-        screen.blit(title_text, title_rect)
+        backend.text(self.font_large, "Aim Trainer", TEXT_COLOR, (screen_width // 2, screen_height // 4), anchor="center")
         
         # 模式选择说明
-        info_text = self.font_medium.render("Select Game Mode:", True, TEXT_COLOR)
-        info_rect = info_text.get_rect(center=(screen_width // 2, screen_height // 3))
-        screen.blit(info_text, info_rect)
+        backend.text(self.font_medium, "Select Game Mode:", TEXT_COLOR, (screen_width // 2, screen_height // 3), anchor="center")
         
-        # 模式1按钮
+        # 模式按钮
+        border = max(1, int(3 * self.layout.ui_scale))
         mouse_pos = pygame.mouse.get_pos()
-        mod1_hover = self.mod1_button.collidepoint(mouse_pos)
-        button_color = BUTTON_HOVER_COLOR if mod1_hover else BUTTON_COLOR
-        pygame.draw.rect(screen, button_color, self.mod1_button)
-        pygame.draw.rect(screen, TEXT_COLOR, self.mod1_button, 3)
-        mod1_text = self.font_medium.render("Mode 1", True, TEXT_COLOR)
-        mod1_rect = mod1_text.get_rect(center=self.mod1_button.center)
-        screen.blit(mod1_text, mod1_rect)
-        
-        # 模式2按钮
-        mod2_hover = self.mod2_button.collidepoint(mouse_pos)
-        button_color = BUTTON_HOVER_COLOR if mod2_hover else BUTTON_COLOR
-        pygame.draw.rect(screen, button_color, self.mod2_button)
-        pygame.draw.rect(screen, TEXT_COLOR, self.mod2_button, 3)
-        mod2_text = self.font_medium.render("Mode 2", True, TEXT_COLOR)
-        mod2_rect = mod2_text.get_rect(center=self.mod2_button.center)
-        screen.blit(mod2_text, mod2_rect)
-        
-        # 模式3按钮
-        mod3_hover = self.mod3_button.collidepoint(mouse_pos)
-        button_color = BUTTON_HOVER_COLOR if mod3_hover else BUTTON_COLOR
-        pygame.draw.rect(screen, button_color, self.mod3_button)
-        pygame.draw.rect(screen, TEXT_COLOR, self.mod3_button, 3)
-        mod3_text = self.font_medium.render("Mode 3", True, TEXT_COLOR)
-        mod3_rect = mod3_text.get_rect(center=self.mod3_button.center)
-        screen.blit(mod3_text, mod3_rect)
-        
-        # 模式说明
-        mod1_desc = self.font_small.render("Normal grid, full area", True, TEXT_COLOR)
-        mod1_desc_rect = mod1_desc.get_rect(center=(self.mod1_button.centerx, self.mod1_button.bottom + 30))
-        screen.blit(mod1_desc, mod1_desc_rect)
-        
-        mod2_desc = self.font_small.render("Larger balls, 3x3 center", True, TEXT_COLOR)
-        mod2_desc_rect = mod2_desc.get_rect(center=(self.mod2_button.centerx, self.mod2_button.bottom + 30))
-        screen.blit(mod2_desc, mod2_desc_rect)
-        
-        mod3_desc = self.font_small.render("Move board, center click", True, TEXT_COLOR)
-        mod3_desc_rect = mod3_desc.get_rect(center=(self.mod3_button.centerx, self.mod3_button.bottom + 30))
-        screen.blit(mod3_desc, mod3_desc_rect)
+        buttons = ((self.mod1_button, "Mode 1", "Normal grid, full area"),
+                   (self.mod2_button, "Mode 2", "Larger balls, 3x3 center"),
+                   (self.mod3_button, "Mode 3", "Move board, center click"))
+        for button, label, description in buttons:
+            button_color = BUTTON_HOVER_COLOR if button.collidepoint(mouse_pos) else BUTTON_COLOR
+            backend.rect(button_color, button)
+            backend.rect(TEXT_COLOR, button, border)
+            backend.text(self.font_medium, label, TEXT_COLOR, button.center, anchor="center")
+            # 模式说明
+            backend.text(self.font_small, description, TEXT_COLOR,
+                         (button.centerx, button.bottom + self.desc_gap), anchor="center")
+        
+        # 无尽模式开关
+        endless_hover = self.endless_button.collidepoint(mouse_pos)
+        button_color = BUTTON_HOVER_COLOR if endless_hover else BUTTON_COLOR
+        backend.rect(button_color, self.endless_button)
+        backend.rect(TEXT_COLOR, self.endless_button, border)
+        backend.text(self.font_small, f"Endless: {'On' if self.endless else 'Off'}", TEXT_COLOR,
+                     self.endless_button.center, anchor="center")
         
         # ESC提示
-        esc_text = self.font_small.render("Press ESC to return", True, TEXT_COLOR)
-        esc_rect = esc_text.get_rect(center=(screen_width // 2, screen_height - 50))
-        screen.blit(esc_text, esc_rect)
+        backend.text(self.font_small, "Press ESC to return", TEXT_COLOR,
+                     (screen_width // 2, screen_height - int(50 * self.layout.ui_scale)), anchor="center")
     
     def handle_click(self, pos):
         """处理模式选择点击"""
@@ -884,65 +1992,217 @@ class ModeSelection:
             return "mod_2"
         elif self.mod3_button.collidepoint(pos):
             return "mod_3"
+        elif self.endless_button.collidepoint(pos):
+            self.endless = not self.endless  # 切换无尽模式
         return None
     
+    def get_game_duration(self):
+        """根据无尽模式开关返回游戏时长（毫秒），无尽模式为None"""
+        return None if self.endless else 60000
+    
+    def get_hovered_button(self, pos):
+        """返回鼠标所在的按钮，不在任何按钮上时返回None"""
+        for button in (self.mod1_button, self.mod2_button, self.mod3_button, self.endless_button):
+            if button.collidepoint(pos):
+                return button
+        return None
+    
+    def update_hover(self, pos):
+        """更新悬停状态，悬停的按钮发生变化时返回True（需要重绘）"""
+        hovered_button = self.get_hovered_button(pos)
+        changed = hovered_button != self.hovered_button
+        self.hovered_button = hovered_button
+        return changed
+    
     def is_button_hovered(self, pos):
         """检查鼠标是否悬停在按钮上"""
-        return self.mod1_button.collidepoint(pos) or self.mod2_button.collidepoint(pos) or self.mod3_button.collidepoint(pos)
+        return (self.mod1_button.collidepoint(pos) or self.mod2_button.collidepoint(pos)
+                or self.mod3_button.collidepoint(pos) or self.endless_button.collidepoint(pos))
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Aim Trainer")
+    parser.add_argument("--leaderboard", default=os.environ.get("AIM_TRAINER_LEADERBOARD"),
+                        help="push results to a leaderboard service at host:port")
+    parser.add_argument("--station", default=None,
+                        help="station name reported to the leaderboard (default: hostname)")
+    parser.add_argument("--width", type=int, default=BASE_SCREEN_WIDTH,
+                        help="window width in pixels (0 = desktop width)")
+    parser.add_argument("--height", type=int, default=BASE_SCREEN_HEIGHT,
+                        help="window height in pixels (0 = desktop height)")
+    parser.add_argument("--fullscreen", action="store_true", help="run in fullscreen mode")
+    parser.add_argument("--fps", type=int, default=240,
+                        help="frame rate cap (0 = refresh rate of the window's display, 240 if unknown)")
+    parser.add_argument("--render-scale", type=float, default=1.0,
+                        help="internal render scale of the game area (0.25-1.0, sdl2 renderer only)")
+    parser.add_argument("--renderer", choices=("software", "sdl2"), default="software",
+                        help="render backend: software surface drawing or SDL2 Renderer textures")
+    parser.add_argument("--endless", action="store_true",
+                        help="start with endless mode enabled (no time limit, ESC ends the session)")
+    parser.add_argument("--challenge-seed", type=int, default=None,
+                        help="play a pre-generated target schedule with this seed (identical on every station)")
+    parser.add_argument("--capture", default=None, metavar="DIR",
+                        help="record the session to DIR (encoded in a background process)")
+    parser.add_argument("--capture-format", choices=CAPTURE_FORMATS, default="png",
+                        help="capture output: PNG image sequence or raw rgb24 video")
+    parser.add_argument("--capture-scale", type=float, default=0.5,
+                        help="capture resolution relative to the window (0.1-1.0)")
+    parser.add_argument("--capture-fps", type=int, default=30,
+                        help="maximum capture frame rate (0 = every presented frame)")
+    parser.add_argument("--input-device", default=None, metavar="PATH",
+                        help="read the mouse directly from an evdev device or recorded event file "
+                             "('auto' = first mouse; Linux only, falls back to SDL input)")
+    parser.add_argument("--no-sound", action="store_true", help="disable hit/miss sounds")
+    parser.add_argument("--audio-buffer", type=int, default=256,
+                        help="mixer buffer size in samples (smaller = lower latency)")
+    return parser.parse_args(argv)
 
 def main():
+    global leaderboard_client, station_name, sound_bank, frame_recorder
+    args = parse_args()
+    if args.station:
+        station_name = args.station
+    if args.leaderboard:
+        host, port = parse_address(args.leaderboard)
+        leaderboard_client = LeaderboardClient(host, port)
+    
+    setup_display(args.width, args.height, args.fullscreen, args.render_scale, args.renderer)
+    target_fps = args.fps if args.fps > 0 else get_refresh_rate()
+    if not args.no_sound:
+        sound_bank = SoundBank(buffer=args.audio_buffer)
+    # evdev点击时间戳（打不开设备时为None，点击时间取处理时的时间）
+    input_device = open_input_device(args.input_device) if args.input_device else None
+    if args.capture:
+        frame_recorder = FrameCapture(args.capture, backend.size, scale=args.capture_scale,
+                                      fps=args.capture_fps, capture_format=args.capture_format)
+    
     clock = pygame.time.Clock()
     current_state = "mode_selection"  # "mode_selection" or "game"
     game = None
     mode_selector = ModeSelection()
+    mode_selector.endless = args.endless
     
     running = True
+    needs_redraw = True
     while running:
-        for event in pygame.event.get():
+        # 画面静止时（菜单、开始前、游戏结束后）阻塞等待输入，空闲时几乎不占CPU；
+        # 游戏计时中或有效果动画时按帧率持续渲染
+        animating = current_state == "game" and game is not None and game.is_animating()
+        if animating:
+            events = pygame.event.get()
+        else:
+            events = [pygame.event.wait()] + pygame.event.get()
+        
+        if input_device is not None:
+            # 点击位置仍用SDL事件，只把点击时间换成evdev记录的内核时间戳
+            input_device.stamp(events)
+        
+        for event in events:
             if event.type == pygame.QUIT:
+                # 无尽模式没有自然结束，退出前保存当前结果
+                if current_state == "game" and game:
+                    if game.is_endless():
+                        game.end_game()
+                    else:
+                        game.abandon()
                 running = False
             elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
+                needs_redraw = True
+                if event.key == pygame.K_h and current_state == "game" and game:
+                    # H键依次切换：关闭 -> 命中率 -> 反应时间 -> 关闭
+                    game.heatmap_view = HEATMAP_VIEWS[(HEATMAP_VIEWS.index(game.heatmap_view) + 1) % len(HEATMAP_VIEWS)]
+                elif event.key == pygame.K_g and current_state == "game" and game:
+                    # G键切换幽灵对手显示
+                    game.show_ghost = not game.show_ghost
+                elif event.key == pygame.K_F2 and current_state == "game" and game:
+                    # F2导出热力图
+                    print(f"Heatmap exported to {', '.join(game.export_heatmap())}")
+                elif event.key == pygame.K_ESCAPE:
                     if current_state == "game":
+                        # 无尽模式按ESC结束并保存，限时模式放弃本局
+                        if game and game.is_endless():
+                            game.end_game()
+                        elif game:
+                            game.abandon()
                         # ESC返回模式选择，恢复光标显示
                         pygame.mouse.set_visible(True)
                         current_state = "mode_selection"
                         game = None
+                        mode_selector.update_hover(pygame.mouse.get_pos())
+                        needs_redraw = True
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:  # 左键点击
                     if current_state == "mode_selection":
                         selected_mode = mode_selector.handle_click(event.pos)
                         if selected_mode:
-                            game = AimTrainer(game_mode=selected_mode, game_duration=60000)
+                            game = AimTrainer(game_mode=selected_mode, game_duration=mode_selector.get_game_duration(),
+                                              challenge_seed=args.challenge_seed)
                             current_state = "game"
                     elif current_state == "game" and game:
                         if not game.game_active and game.game_end_time and pygame.time.get_ticks() - game.game_end_time > 500:  # 防止误点击
                             game.initialize_game()
                         else:
-                            game.handle_click(event.pos)
+                            game.handle_click(event.pos, getattr(event, "kernel_time", None))
+                    needs_redraw = True
             elif event.type == pygame.MOUSEMOTION:
-                # 处理鼠标移动事件（仅模式3）
-                if current_state == "game" and game and game.game_active:
+                if current_state == "mode_selection":
+                    # 菜单只在悬停按钮变化时重绘
+                    if mode_selector.update_hover(event.pos):
+                        needs_redraw = True
+                elif current_state == "game" and game and game.game_active:
+                    # 处理鼠标移动事件（仅模式3，背景随鼠标移动需要重绘）
                     game.handle_mouse_motion(event.pos)
+                    if game.game_mode == "mod_3":
+                        needs_redraw = True
+            elif event.type in (pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED, pygame.WINDOWFOCUSGAINED, pygame.VIDEOEXPOSE):
+                # 窗口被遮挡后恢复，需要重绘
+                needs_redraw = True
         
-        if current_state == "mode_selection":
-            mode_selector.draw()
-        elif current_state == "game" and game:
+        if not running:
+            break
+        
+        if current_state == "game" and game:
             # 检查游戏是否结束
-            game.check_game_end()
+            if game.check_game_end():
+                needs_redraw = True
+            game.update_ghost()
+        
+        redrawn = animating or needs_redraw
+        if redrawn:
+            backend.begin_frame()
+            if current_state == "mode_selection":
+                mode_selector.draw()
+            elif current_state == "game" and game:
+                game.draw()
             
-            game.draw()
-        
-        # 尝试使用OpenGL交换缓冲区以启用垂直同步
-        try:
-            pygame.display.flip()  # 这会使用设置的双缓冲
-        except:
-            # 如果OpenGL不可用，则使用普通更新
-            pygame.display.flip()
-        
-        # 限制帧率为240 FPS，支持高刷新率显示器
-        clock.tick(240)
+            # 录制本帧（只复制到共享内存，编码在后台进程中进行）
+            if frame_recorder is not None:
+                now = pygame.time.get_ticks()
+                if frame_recorder.is_due(now):
+                    frame_recorder.capture(backend.frame_surface, now)
+            
+            # 提交到窗口（同时记录本帧CPU时间和上传字节数）
+            backend.present()
+            needs_redraw = False
+        
+        # 限制帧率（默认240 FPS，支持高刷新率显示器）；空闲时由event.wait阻塞，
+        # 空闲状态下因输入重绘（如模式3开始前移动鼠标）同样不超过帧率，期间的事件留到下一轮一起处理
+        if animating:
+            frame_timer.add(clock.tick(target_fps))
+        elif redrawn:
+            clock.tick(target_fps)
+        else:
+            clock.tick()
     
+    print(f"Renderer {backend.stats_summary()}")
+    if input_device is not None:
+        input_device.close()
+        print(f"Input {input_device.stats_summary()}")
+    if frame_recorder is not None:
+        frame_recorder.close()
+        print(f"Capture {frame_recorder.stats_summary()} -> {frame_recorder.output_dir}")
+    if leaderboard_client is not None:
+        leaderboard_client.close()
     pygame.quit()
     sys.exit()
 
@@ -0,0 +1,230 @@
+"""
+Linux evdev 鼠标点击时间戳
+
+在独立线程中直接读取 /dev/input/eventX 的 input_event 记录，把左键按下的内核事件时间戳
+放入无锁队列（collections.deque）。点击位置和鼠标移动仍然来自SDL事件（已经过系统的指针加速和缩放），
+主循环把SDL的左键按下事件按顺序与evdev的按下记录配对，只用内核时间戳替换处理时的
+pygame.time.get_ticks()。打不开设备时（非Linux、没有权限）由调用方继续只用SDL输入。
+
+录制的事件文件（input_event 记录首尾相接，可以直接 cat /dev/input/eventX > mouse.events 得到）
+可以代替真实设备，按记录的时间间隔回放，用于测试。
+
+用法：
+    python evdev_input.py record /dev/input/event5 mouse.events --seconds 10
+    python evdev_input.py dump mouse.events
+"""
+import argparse
+import glob
+import os
+import select
+import stat
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+import pygame
+
+# struct input_event (64位Linux)：timeval(秒, 微秒), type, code, value
+INPUT_EVENT = struct.Struct("llHHi")
+
+EV_KEY = 0x01
+BTN_LEFT = 0x110
+
+EVIOCSCLOCKID = 0x400445a0  # _IOW('E', 0xa0, int)：设置事件时间戳使用的时钟
+CLOCK_MONOTONIC = 1
+
+# 按下记录超过这个时间仍没有对应的SDL点击（例如点在窗口外）时丢弃 (毫秒)
+MAX_CLICK_SKEW = 250
+
+
+def find_mouse_device():
+    """查找第一个鼠标设备（/dev/input/by-id/*-event-mouse）"""
+    devices = sorted(glob.glob("/dev/input/by-id/*-event-mouse"))
+    return os.path.realpath(devices[0]) if devices else None
+
+
+class EvdevInput:
+    """
+    evdev 左键按下时间戳
+
+    队列中的每一项为按下时间，已换算为 pygame.time.get_ticks() 的毫秒数。
+    回放录制文件时 pace=True 按记录的间隔投递。
+    """
+    def __init__(self, path, pace=True):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        self.is_device = stat.S_ISCHR(os.fstat(self.fd).st_mode)
+        self.pace = pace and not self.is_device
+
+        # 内核时间戳 -> pygame毫秒：设备尽量切换到单调时钟，失败时使用系统时钟；
+        # 录制文件在读到第一条事件时对齐到开始回放的时刻
+        self.clock = None
+        if self.is_device:
+            self.clock = time.time
+            try:
+                import fcntl
+                fcntl.ioctl(self.fd, EVIOCSCLOCKID, struct.pack("i", CLOCK_MONOTONIC))
+                self.clock = time.monotonic
+            except (ImportError, OSError):
+                pass
+            self.offset = pygame.time.get_ticks() - self.clock() * 1000
+        else:
+            self.offset = None
+        self.start_ticks = pygame.time.get_ticks()
+
+        self.presses = deque(maxlen=64)  # 读线程 append，主循环 popleft，不需要加锁
+        self.unmatched_until = None  # 最近一次没配上的SDL点击的处理时间，此前发生的按下属于它
+        self.finished = False  # 录制文件读完或设备断开
+
+        # 统计信息
+        self.matched_count = 0
+        self.unmatched_count = 0  # 没有对应按下记录的SDL点击（使用处理时的时间）
+        self.delays = deque(maxlen=256)  # 按下到被主循环处理的延迟
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._read_loop, name="evdev-input", daemon=True)
+        self._thread.start()
+
+    def _event_time(self, seconds, microseconds):
+        """把内核时间戳换算为pygame毫秒"""
+        event_ms = seconds * 1000 + microseconds / 1000
+        if self.offset is None:
+            self.offset = self.start_ticks - event_ms
+        return event_ms + self.offset
+
+    def _read_loop(self):
+        buffer = b""
+        try:
+            while not self._stop.is_set():
+                if self.is_device:
+                    # 带超时等待，使 close() 能结束线程
+                    readable, _, _ = select.select([self.fd], [], [], 0.1)
+                    if not readable:
+                        continue
+                data = os.read(self.fd, INPUT_EVENT.size * 64)
+                if not data:
+                    break
+                buffer += data
+                usable = len(buffer) - len(buffer) % INPUT_EVENT.size
+                for seconds, microseconds, event_type, code, value in INPUT_EVENT.iter_unpack(buffer[:usable]):
+                    if event_type == EV_KEY and code == BTN_LEFT and value == 1:
+                        event_time = self._event_time(seconds, microseconds)
+                        if self.pace:
+                            delay = (event_time - pygame.time.get_ticks()) / 1000
+                            if delay > 0 and self._stop.wait(delay):
+                                return
+                        self.presses.append(event_time)
+                buffer = buffer[usable:]
+        except OSError:
+            pass
+        finally:
+            self.finished = True
+
+    def stamp(self, events):
+        """
+        给SDL的左键按下事件加上 kernel_time（内核记录的按下时间）
+
+        按顺序配对：太旧的按下记录（SDL没有对应点击）和早于上一次没配上的点击的记录被丢弃；
+        没有可配对记录的点击不加 kernel_time，由 handle_click 使用处理时的时间。
+        """
+        clicks = [event for event in events if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1]
+        if not clicks:
+            return
+        now = pygame.time.get_ticks()
+        for event in clicks:
+            press_time = None
+            while self.presses:
+                candidate = self.presses.popleft()
+                if now - candidate > MAX_CLICK_SKEW:
+                    continue
+                if self.unmatched_until is not None and candidate <= self.unmatched_until:
+                    continue
+                press_time = candidate
+                break
+            if press_time is None:
+                self.unmatched_count += 1
+                self.unmatched_until = now
+                continue
+            event.kernel_time = int(press_time)
+            self.matched_count += 1
+            self.delays.append(now - press_time)
+
+    def average_delay(self):
+        """点击从内核时间戳到被主循环处理的平均延迟 (毫秒)"""
+        return sum(self.delays) / len(self.delays) if self.delays else 0.0
+
+    def stats_summary(self):
+        return (f"{self.path}: {self.matched_count} clicks timestamped, {self.unmatched_count} unmatched, "
+                f"click queue delay {self.average_delay():.2f}ms")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(1.0)
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+def open_input_device(path):
+    """打开输入设备（"auto" 自动查找鼠标），失败时返回None（使用SDL输入）"""
+    if path == "auto":
+        path = find_mouse_device()
+        if path is None:
+            print("No evdev mouse found, using SDL input")
+            return None
+    try:
+        return EvdevInput(path)
+    except OSError as e:
+        print(f"Cannot open {path} ({e}), using SDL input")
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record or inspect evdev mouse event files")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="record raw input events from a device")
+    record_parser.add_argument("device", help="input device, e.g. /dev/input/event5 (or 'auto')")
+    record_parser.add_argument("output")
+    record_parser.add_argument("--seconds", type=float, default=10.0)
+
+    dump_parser = subparsers.add_parser("dump", help="print the events in a recorded file")
+    dump_parser.add_argument("input")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        device = find_mouse_device() if args.device == "auto" else args.device
+        if device is None:
+            print("No evdev mouse found")
+            return 1
+        fd = os.open(device, os.O_RDONLY)
+        deadline = time.monotonic() + args.seconds
+        count = 0
+        with open(args.output, 'wb') as f:
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                readable, _, _ = select.select([fd], [], [], timeout)
+                if readable:
+                    data = os.read(fd, INPUT_EVENT.size * 64)
+                    f.write(data)
+                    count += len(data) // INPUT_EVENT.size
+        os.close(fd)
+        print(f"Recorded {count} events from {device} to {args.output}")
+        return 0
+
+    with open(args.input, 'rb') as f:
+        data = f.read()
+    usable = len(data) - len(data) % INPUT_EVENT.size
+    for seconds, microseconds, event_type, code, value in INPUT_EVENT.iter_unpack(data[:usable]):
+        print(f"{seconds}.{microseconds:06d} type={event_type} code={code} value={value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+训练画面录制（后台进程编码）
+
+渲染线程每次提交画面时（按录制帧率）把合成好的画面缩小后复制到共享内存中预先分配的帧槽，
+再把槽号交给独立的编码进程写成PNG序列或原始视频文件。没有空闲帧槽时直接丢弃这一帧并计数，
+渲染循环永远不会等待编码。
+
+输出目录内容：
+    capture.json      录制参数（尺寸、格式、像素格式）
+    frames.csv        帧序号与游戏时间（毫秒）；画面静止时不提交新帧，所以帧间隔不固定
+    frame_000000.png  PNG序列（--capture-format png）
+    frames.rgb        原始视频，rgb24（--capture-format raw），可用
+                      ffmpeg -f rawvideo -pix_fmt rgb24 -s WxH -i frames.rgb 转码
+"""
+import json
+import multiprocessing
+import os
+import queue
+import time
+from multiprocessing import shared_memory
+
+import pygame
+
+CAPTURE_FORMATS = ("png", "raw")
+
+
+def _encoder_main(shm_name, size, slot_bytes, output_dir, capture_format, filled, free, results):
+    """编码进程：依次取出填好的帧槽，写入磁盘后把槽号还给渲染线程"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    encoded = 0
+    encode_time = 0.0
+    raw_file = open(os.path.join(output_dir, "frames.rgb"), 'wb') if capture_format == "raw" else None
+    index_file = open(os.path.join(output_dir, "frames.csv"), 'w', encoding='utf-8')
+    index_file.write("frame,time_ms\n")
+    results.put("ready")
+    try:
+        while True:
+            item = filled.get()
+            if item is None:
+                break
+            slot, timestamp = item
+            start = time.perf_counter()
+            data = shm.buf[slot * slot_bytes:(slot + 1) * slot_bytes]
+            if raw_file is not None:
+                raw_file.write(data)
+            else:
+                image = pygame.image.frombuffer(bytes(data), size, "RGB")
+                pygame.image.save(image, os.path.join(output_dir, f"frame_{encoded:06d}.png"))
+            data.release()
+            index_file.write(f"{encoded},{timestamp}\n")
+            free.put(slot)
+            encoded += 1
+            encode_time += time.perf_counter() - start
+    finally:
+        if raw_file is not None:
+            raw_file.close()
+        index_file.close()
+        shm.close()
+        results.put({"encoded": encoded, "encode_time": encode_time})
+
+
+class FrameCapture:
+    """
+    画面录制器
+
+    frame_size 为窗口尺寸，按 scale 缩小后录制；ring_size 为共享内存中的帧槽数量，
+    编码跟不上时最多积压这么多帧，之后的帧被丢弃。
+    """
+    def __init__(self, output_dir, frame_size, scale=0.5, fps=30, ring_size=8, capture_format="png"):
+        if capture_format not in CAPTURE_FORMATS:
+            raise ValueError(f"unknown capture format: {capture_format}")
+        self.output_dir = output_dir
+        self.scale = min(1.0, max(0.1, scale))
+        self.size = (max(1, int(frame_size[0] * self.scale)), max(1, int(frame_size[1] * self.scale)))
+        self.interval = 1000.0 / fps if fps > 0 else 0.0  # 两帧之间的最小间隔 (毫秒)
+        self.capture_format = capture_format
+
+        # 统计信息
+        self.captured_count = 0
+        self.dropped_count = 0
+        self.capture_time = 0.0  # 渲染线程上花费的总时间 (秒)
+        self.encoder_stats = None
+
+        self.last_capture = None
+        self.frame = None  # 缩小后的帧（预先分配，格式与源画面一致）
+        self.slot_bytes = self.size[0] * self.size[1] * 3
+
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, "capture.json"), 'w', encoding='utf-8') as f:
+            json.dump({"width": self.size[0], "height": self.size[1], "format": capture_format,
+                       "pixel_format": "rgb24", "fps_limit": fps}, f, indent=2)
+
+        # 用spawn启动编码进程：此时音频、排行榜、输入等线程已在运行，fork之后子进程可能死锁
+        context = multiprocessing.get_context("spawn")
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * ring_size)
+        self.filled = context.Queue()
+        self.free = context.Queue()
+        self.results = context.Queue()
+        self.free_slots = list(range(ring_size))  # 渲染线程本地可用的帧槽
+        # 每个帧槽对应一个直接指向共享内存的rgb24表面，录制时直接blit进去，不产生临时对象
+        self.slot_views = [self.shm.buf[slot * self.slot_bytes:(slot + 1) * self.slot_bytes] for slot in range(ring_size)]
+        self.slot_surfaces = [pygame.image.frombuffer(view, self.size, "RGB") for view in self.slot_views]
+        self.encoder = context.Process(
+            target=_encoder_main, name="frame-encoder", daemon=True,
+            args=(self.shm.name, self.size, self.slot_bytes, output_dir, capture_format,
+                  self.filled, self.free, self.results))
+        self.encoder.start()
+        # 等编码进程启动完成（spawn需要重新导入模块），开局前等待，避免录制开头积压丢帧
+        try:
+            self.results.get(timeout=10.0)
+        except queue.Empty:
+            pass
+
+    def is_due(self, now):
+        """距离上一帧是否已达到录制间隔"""
+        return self.last_capture is None or now - self.last_capture >= self.interval
+
+    def _take_slot(self):
+        """取一个空闲帧槽（只做非阻塞检查，没有时返回None）"""
+        try:
+            while True:
+                self.free_slots.append(self.free.get_nowait())
+        except queue.Empty:
+            pass
+        return self.free_slots.pop() if self.free_slots else None
+
+    def capture(self, get_frame, now):
+        """
+        录制一帧（在提交画面之前调用），返回是否录下
+
+        get_frame 返回本帧合成好的画面；没有空闲帧槽时不调用，读回画面的时间计入录制开销。
+        """
+        self.last_capture = now
+        start = time.perf_counter()
+        slot = self._take_slot()
+        if slot is None:
+            self.dropped_count += 1
+            self.capture_time += time.perf_counter() - start
+            return False
+
+        surface = get_frame()
+        if surface.get_size() == self.size:
+            frame = surface
+        else:
+            if self.frame is None or self.frame.get_bitsize() != surface.get_bitsize():
+                self.frame = pygame.Surface(self.size, 0, surface)
+            pygame.transform.scale(surface, self.size, self.frame)
+            frame = self.frame
+        # blit时转换为rgb24，直接写入共享内存中的帧槽
+        self.slot_surfaces[slot].blit(frame, (0, 0))
+        self.filled.put_nowait((slot, now))
+        self.captured_count += 1
+        self.capture_time += time.perf_counter() - start
+        return True
+
+    def average_overhead(self):
+        """每帧录制在渲染线程上的平均开销 (毫秒)"""
+        frames = self.captured_count + self.dropped_count
+        return self.capture_time * 1000 / frames if frames else 0.0
+
+    def stats_summary(self):
+        summary = (f"captured {self.captured_count}, dropped {self.dropped_count}, "
+                   f"overhead {self.average_overhead():.2f}ms/frame")
+        if self.encoder_stats and self.encoder_stats["encoded"]:
+            encoded = self.encoder_stats["encoded"]
+            summary += f", encoded {encoded} ({self.encoder_stats['encode_time'] * 1000 / encoded:.1f}ms/frame)"
+        return summary
+
+    def close(self, timeout=10.0):
+        """等待编码进程写完剩余帧后退出"""
+        if self.encoder is None:
+            return
+        self.filled.put(None)
+        try:
+            self.encoder_stats = self.results.get(timeout=timeout)
+        except queue.Empty:
+            self.encoder_stats = None
+        self.encoder.join(timeout)
+        if self.encoder.is_alive():
+            self.encoder.terminate()
+        self.encoder = None
+        # 先释放指向共享内存的表面和视图，否则无法关闭共享内存
+        self.slot_surfaces = []
+        for view in self.slot_views:
+            view.release()
+        self.slot_views = []
+        self.shm.close()
+        self.shm.unlink()
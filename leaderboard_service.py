@@ -0,0 +1,400 @@
+"""
+局域网排行榜聚合服务
+
+各训练机在每局结束后把成绩推送到本服务，服务端在内存中按 (game_mode, endless)
+维护排好序的排行榜（无尽模式与限时模式分开排名），并回答 top-N 查询。
+
+协议：TCP 上的按行分隔 JSON（每行一个请求，每行一个响应）
+    {"op": "push", "records": [...]}            -> {"ok": true, "count": k, "rejected": r}
+    {"op": "top", "game_mode": "mod_1", "endless": false, "n": 10} -> {"ok": true, "entries": [...]}
+    {"op": "ping"}                               -> {"ok": true}
+
+用法：
+    python leaderboard_service.py serve --port 8765
+    python leaderboard_service.py top mod_1 -n 10
+    python leaderboard_service.py top mod_1 --endless
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import math
+import sys
+import threading
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_LINE_BYTES = 1 << 20  # 单行请求最大1MB（足够容纳一批成绩）
+
+
+def validate_record(record):
+    """检查一条成绩，返回错误说明，合法时返回None"""
+    if not isinstance(record, dict):
+        return "record must be an object"
+    if not isinstance(record.get("game_mode", "mod_1"), str):
+        return "game_mode must be a string"
+    score = record.get("score", 0)
+    # NaN/无穷大会破坏排行榜的二分查找顺序
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or not math.isfinite(score):
+        return "score must be a finite number"
+    return None
+
+
+class Leaderboard:
+    """单个模式的排行榜，按分数降序维护，分数相同时先到者靠前"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._keys = []  # (-score, seq)，与 _records 一一对应
+        self._records = []
+        self._seq = 0
+
+    def add(self, record):
+        """插入一条成绩（二分查找定位，保持有序）"""
+        try:
+            score = float(record.get("score", 0))
+        except (TypeError, ValueError):
+            return False
+        if not math.isfinite(score):
+            return False
+        key = (-score, self._seq)
+        self._seq += 1
+        index = bisect.bisect_right(self._keys, key)
+        if index >= self.max_entries:
+            return False  # 排不进榜单，直接丢弃
+        self._keys.insert(index, key)
+        self._records.insert(index, record)
+        if len(self._keys) > self.max_entries:
+            self._keys.pop()
+            self._records.pop()
+        return True
+
+    def top(self, n):
+        """返回前n名"""
+        return self._records[:max(0, n)]
+
+    def __len__(self):
+        return len(self._records)
+
+
+class LeaderboardServer:
+    """基于asyncio的排行榜聚合服务"""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, max_entries=10000):
+        self.host = host
+        self.port = port  # 传入0时由系统分配端口，start()之后更新为实际端口
+        self.max_entries = max_entries
+        self.boards = {}
+        self._server = None
+
+    def add_records(self, records):
+        """把一批成绩写入对应模式的排行榜，返回 (实际入榜数量, 被拒绝的数量)；不合法的成绩逐条跳过"""
+        added = 0
+        rejected = 0
+        for record in records:
+            if validate_record(record) is not None:
+                rejected += 1
+                continue
+            key = (record.get("game_mode", "mod_1"), bool(record.get("endless", False)))
+            board = self.boards.get(key)
+            if board is None:
+                board = self.boards[key] = Leaderboard(self.max_entries)
+            if board.add(record):
+                added += 1
+        return added, rejected
+
+    def top(self, game_mode, n=10, endless=False):
+        """查询指定模式（限时或无尽）的前n名"""
+        board = self.boards.get((game_mode, bool(endless)))
+        return board.top(n) if board else []
+
+    def handle_request(self, request):
+        """处理单个请求，返回响应字典"""
+        op = request.get("op")
+        if op == "push":
+            records = request.get("records", [])
+            if not isinstance(records, list):
+                return {"ok": False, "error": "records must be a list"}
+            added, rejected = self.add_records(records)
+            return {"ok": True, "count": added, "rejected": rejected}
+        if op == "top":
+            try:
+                n = int(request.get("n", 10))
+            except (TypeError, ValueError):
+                return {"ok": False, "error": "n must be an integer"}
+            game_mode = request.get("game_mode", "mod_1")
+            if not isinstance(game_mode, str):
+                return {"ok": False, "error": "game_mode must be a string"}
+            return {"ok": True, "entries": self.top(game_mode, n, request.get("endless", False))}
+        if op == "ping":
+            return {"ok": True}
+        return {"ok": False, "error": f"unknown op: {op}"}
+
+    async def start(self):
+        """启动监听"""
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, limit=MAX_LINE_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader, writer):
+        """每个连接可以连续发送多个请求（客户端使用长连接）"""
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    response = {"ok": False, "error": "request too large"}
+                    writer.write((json.dumps(response) + "\n").encode("utf-8"))
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be an object")
+                    response = self.handle_request(request)
+                except (TypeError, ValueError) as e:
+                    # 单个请求出错只回复错误，不断开连接（客户端断线后会重发同一批）
+                    response = {"ok": False, "error": str(e)}
+                writer.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+class LeaderboardClient:
+    """
+    训练机端的推送客户端
+
+    在独立线程中运行事件循环，维护一个长连接池。submit() 只把成绩放入队列后
+    立即返回，不做任何网络I/O；后台发送协程把成绩按批合并后推送，断线时自动重连。
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, pool_size=2, batch_size=32,
+                 flush_interval=0.2, max_pending=1000, reconnect_delay=1.0):
+        self.host = host
+        self.port = port
+        self.pool_size = max(1, pool_size)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.reconnect_delay = reconnect_delay
+
+        # 统计信息
+        self.sent_count = 0
+        self.dropped_count = 0
+
+        self._queue = None
+        self._in_flight = 0
+        self._unreachable = 0  # 正在等待重连的发送者数量
+        self._closing = False
+        self._ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="leaderboard-client", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._workers = [self._loop.create_task(self._sender()) for _ in range(self.pool_size)]
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    def submit(self, record):
+        """提交一条成绩（非阻塞，队列满时丢弃并计数）"""
+        if self._closing:
+            return False
+        self._loop.call_soon_threadsafe(self._enqueue, dict(record))
+        return True
+
+    def _enqueue(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped_count += 1
+
+    async def _collect_batch(self):
+        """等待第一条成绩，然后在 flush_interval 内尽量多收集一些组成一批"""
+        batch = [await self._queue.get()]
+        self._in_flight += 1
+        deadline = self._loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                self._in_flight += 1
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _sender(self):
+        """连接池中的单个发送者：持有一条长连接并循环推送批次"""
+        reader = writer = None
+        batch = None
+        while True:
+            if batch is None:
+                batch = await self._collect_batch()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(
+                        self.host, self.port, limit=MAX_LINE_BYTES)
+                payload = json.dumps({"op": "push", "records": batch}, ensure_ascii=False)
+                writer.write((payload + "\n").encode("utf-8"))
+                await writer.drain()
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError("connection closed by server")
+                response = json.loads(line)
+                if isinstance(response, dict) and response.get("ok"):
+                    # 被服务端逐条拒绝的成绩（格式不合法）计为丢弃
+                    rejected = response.get("rejected", 0)
+                    rejected = min(len(batch), rejected) if isinstance(rejected, int) else 0
+                    self.sent_count += len(batch) - rejected
+                    self.dropped_count += rejected
+                else:
+                    # 服务端拒绝了这一批（重试也不会成功），计为丢弃
+                    self.dropped_count += len(batch)
+                self._in_flight -= len(batch)
+                batch = None
+            except (OSError, ConnectionError, ValueError):
+                # 断线：丢弃当前连接，稍后带着同一批数据重试
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+                if self._closing:
+                    self.dropped_count += len(batch)
+                    self._in_flight -= len(batch)
+                    batch = None
+                    continue
+                self._unreachable += 1
+                try:
+                    await asyncio.sleep(self.reconnect_delay)
+                finally:
+                    self._unreachable -= 1
+
+    async def _request(self, request):
+        reader, writer = await asyncio.open_connection(self.host, self.port, limit=MAX_LINE_BYTES)
+        try:
+            writer.write((json.dumps(request) + "\n").encode("utf-8"))
+            await writer.drain()
+            return json.loads(await reader.readline())
+        finally:
+            writer.close()
+
+    def query_top(self, game_mode, n=10, endless=False, timeout=2.0):
+        """查询排行榜（阻塞调用，用于工具和测试，不要在渲染循环中调用）"""
+        future = asyncio.run_coroutine_threadsafe(
+            self._request({"op": "top", "game_mode": game_mode, "endless": endless, "n": n}), self._loop)
+        response = future.result(timeout)
+        return response.get("entries", []) if response.get("ok") else []
+
+    async def _wait_drained(self, give_up_unreachable=False):
+        while self._queue.qsize() or self._in_flight:
+            if give_up_unreachable and self._unreachable:
+                raise ConnectionError("leaderboard service unreachable")
+            await asyncio.sleep(0.01)
+
+    def flush(self, timeout=2.0, give_up_unreachable=False):
+        """等待队列中的成绩全部发出，成功返回True（give_up_unreachable 时服务连不上立即返回False）"""
+        future = asyncio.run_coroutine_threadsafe(self._wait_drained(give_up_unreachable), self._loop)
+        try:
+            future.result(timeout)
+            return True
+        except Exception:
+            future.cancel()
+            return False
+
+    def close(self, timeout=2.0):
+        """尽量发出剩余成绩后关闭后台线程（服务连不上时不等待），没发出的成绩计为丢弃"""
+        if self._closing:
+            return
+        self.flush(timeout, give_up_unreachable=True)
+        self._closing = True
+
+        async def shutdown():
+            for task in self._workers:
+                task.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            # 队列中和被取消的批次里的成绩都没有发出
+            self.dropped_count += self._queue.qsize() + self._in_flight
+            self._in_flight = 0
+            self._loop.stop()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop)
+        self._thread.join(timeout)
+
+
+def parse_address(address):
+    """解析 host:port 形式的地址"""
+    host, _, port = address.rpartition(":")
+    return (host or DEFAULT_HOST), int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aim Trainer leaderboard aggregation service")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="run the aggregation service")
+    serve_parser.add_argument("--host", default=DEFAULT_HOST)
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--max-entries", type=int, default=10000)
+
+    top_parser = subparsers.add_parser("top", help="print the top-N entries of a mode")
+    top_parser.add_argument("game_mode")
+    top_parser.add_argument("-n", type=int, default=10)
+    top_parser.add_argument("--endless", action="store_true", help="show the endless-mode board")
+    top_parser.add_argument("--server", default=f"{DEFAULT_HOST}:{DEFAULT_PORT}")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        server = LeaderboardServer(args.host, args.port, args.max_entries)
+
+        async def run():
+            await server.start()
+            print(f"Leaderboard service listening on {server.host}:{server.port}")
+            await server.serve_forever()
+
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    host, port = parse_address(args.server)
+    client = LeaderboardClient(host, port, pool_size=1)
+    try:
+        entries = client.query_top(args.game_mode, args.n, args.endless)
+    finally:
+        client.close()
+    for rank, entry in enumerate(entries, 1):
+        station = entry.get("station", "?")
+        print(f"{rank:>3}. {entry.get('score')}  {station}  {entry.get('timestamp', '')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""
+按不同计分规则批量重算已记录的训练成绩
+
+轨迹文件（aim_trainer_traces/*.trace）记录了每次点击的命中/失误和计分时的同屏小球数量，
+连击数可以由命中序列推出，所以任何只依赖「连击数 + 同屏小球数」的计分规则都能离线重算。
+所有轨迹一次性读入同一组NumPy数组，用累积运算算出连击数和每次点击的得分，不逐条循环。
+
+依赖：numpy（只有本工具需要，游戏本身不需要）
+
+用法：
+    python rescore_sessions.py                          # 历史记录中的所有对局，按当前规则重算并校验
+    python rescore_sessions.py --rules legacy            # 按旧规则重算
+    python rescore_sessions.py --set base_bonus=3 --set threshold_factor=1.5
+    python rescore_sessions.py --traces aim_trainer_traces --json rescored.json
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from trace_format import TRACE_DIR, TRACE_FIELDS, TRACE_HEADER, TRACE_MAGIC, TRACE_RECORD, TRACE_VERSION
+
+HISTORY_FILE = "aim_trainer_history.json"
+
+# 轨迹记录的NumPy结构化类型（字段与 trace_format.TRACE_RECORD 相同，按小端序紧密排列）
+TRACE_DTYPE = np.dtype([(name, "<" + code) for name, code in TRACE_FIELDS])
+assert TRACE_DTYPE.itemsize == TRACE_RECORD.size
+
+
+class ScoringRules:
+    """
+    计分规则参数（默认值与 AimTrainer 的 calculate_current_ball_score 相同）
+
+    连击阈值 = max(threshold_min, threshold_factor * max_balls - 同屏小球数 + 1)
+    连击奖励 = int(base_bonus * (1 + (max_balls - 同屏小球数) * bonus_step))
+    命中得分 = base_score + (连击数 // 连击阈值) * 连击奖励，失误得分 = -miss_penalty
+    """
+
+    def __init__(self, base_score=100, miss_penalty=100, max_balls=3, threshold_factor=2,
+                 threshold_min=2, base_bonus=2, bonus_step=0.1):
+        self.base_score = base_score
+        self.miss_penalty = miss_penalty
+        self.max_balls = max_balls
+        self.threshold_factor = threshold_factor
+        self.threshold_min = threshold_min
+        self.base_bonus = base_bonus
+        self.bonus_step = bonus_step
+
+    def copy(self, **overrides):
+        params = dict(vars(self))
+        params.update(overrides)
+        return ScoringRules(**params)
+
+    def click_points(self, hit, balls, combo):
+        """每次点击的得分（全部为数组运算）"""
+        balls = balls.astype(np.int64)
+        threshold = np.maximum(self.threshold_min,
+                               (self.threshold_factor * self.max_balls - balls + 1).astype(np.int64))
+        # 与游戏中的 int(base_bonus * bonus_multiplier) 相同：先按浮点计算再向零取整
+        bonus = np.trunc(self.base_bonus * (1.0 + (self.max_balls - balls) * self.bonus_step)).astype(np.int64)
+        hit_points = self.base_score + (combo // threshold) * bonus
+        return np.where(hit, hit_points, -self.miss_penalty)
+
+
+# 规则版本表：提议新规则时在这里加一项，或用 --set 临时覆盖参数
+RULES = {
+    "current": ScoringRules(),
+    "legacy": ScoringRules(base_bonus=7, bonus_step=0.2),  # 降低奖励之前的基础奖励和增幅
+}
+
+
+def load_trace(path):
+    """读取一个轨迹文件为结构化数组（格式不符时返回None，末尾不完整的记录被忽略）"""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(TRACE_HEADER.size)
+            if len(header) < TRACE_HEADER.size or TRACE_HEADER.unpack(header) != (TRACE_MAGIC, TRACE_VERSION):
+                return None
+            data = f.read()
+    except OSError:
+        return None
+    # 按实际读到的长度计算记录数（游戏可能还在写这个文件）
+    return np.frombuffer(data, dtype=TRACE_DTYPE, count=len(data) // TRACE_DTYPE.itemsize)
+
+
+class SessionArchive:
+    """所有对局的点击记录首尾相接存放在一个数组中，starts 是每局第一条记录的下标"""
+
+    def __init__(self, sessions):
+        self.sessions = []  # 每局的元数据 (轨迹文件, 历史记录或None)
+        traces = []
+        for path, record in sessions:
+            trace = load_trace(path)
+            if trace is None or len(trace) == 0:
+                continue
+            self.sessions.append((path, record))
+            traces.append(trace)
+
+        self.clicks = np.concatenate(traces) if traces else np.zeros(0, dtype=TRACE_DTYPE)
+        lengths = np.array([len(trace) for trace in traces], dtype=np.int64)
+        self.starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if traces else np.zeros(0, dtype=np.int64)
+        self.session_ids = np.repeat(np.arange(len(traces)), lengths)
+
+    @classmethod
+    def from_history(cls, history_file=HISTORY_FILE):
+        """历史记录中仍保留轨迹文件的对局"""
+        try:
+            with open(history_file, 'r', encoding='utf-8') as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            history = []
+        return cls([(record["trace_file"], record) for record in history
+                    if record.get("trace_file") and os.path.exists(record["trace_file"])])
+
+    @classmethod
+    def from_directory(cls, directory=TRACE_DIR, history_file=HISTORY_FILE):
+        """目录下的所有轨迹文件（能在历史记录中找到的附带元数据）"""
+        try:
+            with open(history_file, 'r', encoding='utf-8') as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            history = []
+        by_trace = {os.path.normpath(record["trace_file"]): record for record in history if record.get("trace_file")}
+        paths = sorted(glob.glob(os.path.join(directory, "*.trace")))
+        return cls([(path, by_trace.get(os.path.normpath(path))) for path in paths])
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def combo_counts(self):
+        """
+        每次点击之前的连击数
+
+        连击从每局开始或上一次失误之后重新计数：把这些「起点」的下标做累积最大值，
+        得到每条记录所在连击段的起点，连击数 = 下标 - 起点。
+        """
+        hit = self.clicks["hit"].astype(bool)
+        index = np.arange(len(self.clicks), dtype=np.int64)
+        run_start = np.where(hit, 0, index + 1)
+        run_start[self.starts] = np.maximum(run_start[self.starts], self.starts)
+        np.maximum.accumulate(run_start, out=run_start)
+        return index - run_start
+
+    def click_points(self, rules):
+        hit = self.clicks["hit"].astype(bool)
+        return rules.click_points(hit, self.clicks["balls"], self.combo_counts())
+
+    def session_scores(self, rules):
+        """按规则重算每局总分"""
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.add.reduceat(self.click_points(rules), self.starts)
+
+    def recorded_scores(self):
+        """轨迹中记录的每局最终得分"""
+        ends = np.append(self.starts[1:], len(self.clicks)) - 1
+        return self.clicks["score"][ends].astype(np.int64)
+
+    def verify(self, rules):
+        """按规则逐条累加后与轨迹中记录的分数比较，返回不一致的对局下标"""
+        points = self.click_points(rules)
+        running = np.cumsum(points)
+        # 减去前面各局的累计值，得到每局内部的累计分数
+        offsets = np.concatenate(([0], running[self.starts[1:] - 1])) if len(self) else np.zeros(0, dtype=np.int64)
+        running -= offsets[self.session_ids]
+        mismatch = running != self.clicks["score"]
+        return np.unique(self.session_ids[mismatch])
+
+
+def parse_override(text):
+    """解析 --set name=value"""
+    name, _, value = text.partition("=")
+    if name not in vars(ScoringRules()):
+        raise argparse.ArgumentTypeError(f"unknown rule parameter: {name}")
+    try:
+        return name, int(value)
+    except ValueError:
+        try:
+            return name, float(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid value for {name}: {value}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score recorded Aim Trainer sessions under alternative scoring rules")
+    parser.add_argument("--rules", choices=sorted(RULES), default="current", help="rule version to apply")
+    parser.add_argument("--set", dest="overrides", action="append", type=parse_override, default=[],
+                        metavar="NAME=VALUE", help="override a rule parameter (repeatable)")
+    parser.add_argument("--history", default=HISTORY_FILE, help="history file with trace_file entries")
+    parser.add_argument("--traces", default=None, metavar="DIR",
+                        help="re-score every .trace file in DIR instead of the sessions in the history")
+    parser.add_argument("--json", default=None, metavar="PATH", help="write per-session results to a JSON file")
+    parser.add_argument("--quiet", action="store_true", help="only print the per-mode summary")
+    args = parser.parse_args(argv)
+
+    rules = RULES[args.rules].copy(**dict(args.overrides))
+
+    start = time.perf_counter()
+    if args.traces:
+        archive = SessionArchive.from_directory(args.traces, args.history)
+    else:
+        archive = SessionArchive.from_history(args.history)
+    load_time = time.perf_counter() - start
+    if len(archive) == 0:
+        print("No recorded sessions found")
+        return 1
+
+    start = time.perf_counter()
+    new_scores = archive.session_scores(rules)
+    score_time = time.perf_counter() - start
+    old_scores = archive.recorded_scores()
+
+    # 当前规则应能逐条复现记录的分数，不一致说明轨迹和计分代码已经对不上
+    mismatched = archive.verify(RULES["current"])
+
+    results = []
+    for i, (path, record) in enumerate(archive.sessions):
+        record = record or {}
+        results.append({
+            "trace_file": path,
+            "game_mode": record.get("game_mode", "?"),
+            "endless": bool(record.get("endless", False)),
+            "timestamp": record.get("timestamp", ""),
+            "challenge_seed": record.get("challenge_seed"),
+            "recorded_score": int(old_scores[i]),
+            "rescored": int(new_scores[i]),
+        })
+
+    if not args.quiet:
+        print(f"{'timestamp':<20} {'mode':<6} {'recorded':>9} {'rescored':>9} {'delta':>7}")
+        for result in results:
+            print(f"{result['timestamp']:<20} {result['game_mode']:<6} {result['recorded_score']:>9} "
+                  f"{result['rescored']:>9} {result['rescored'] - result['recorded_score']:>+7}")
+        print()
+
+    # 无尽模式与限时模式分开汇总
+    for game_mode, endless in sorted({(result["game_mode"], result["endless"]) for result in results}):
+        mode_results = [result for result in results
+                        if result["game_mode"] == game_mode and result["endless"] == endless]
+        old_avg = sum(result["recorded_score"] for result in mode_results) / len(mode_results)
+        new_avg = sum(result["rescored"] for result in mode_results) / len(mode_results)
+        label = f"{game_mode} endless" if endless else game_mode
+        print(f"{label}: {len(mode_results)} sessions, average {old_avg:.1f} -> {new_avg:.1f}")
+
+    print(f"Rules: {args.rules} {vars(rules)}")
+    print(f"{len(archive)} sessions, {len(archive.clicks)} clicks: load {load_time * 1000:.1f}ms, "
+          f"rescore {score_time * 1000:.1f}ms")
+    if len(mismatched):
+        print(f"Warning: {len(mismatched)} sessions do not reproduce their recorded scores under the current rules")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"rules": args.rules, "parameters": vars(rules), "sessions": results}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""
+点击轨迹文件格式（游戏和离线工具共用，不依赖pygame）
+
+文件头 + 定长记录，全部为小端序：
+    文件头：魔数 "AIMT", 版本号
+    记录：距第一次点击的毫秒数, x, y, 是否命中, 计分时的同屏小球数（被点中的小球已移除）, 点击后的总分
+"""
+import struct
+
+TRACE_MAGIC = b"AIMT"
+TRACE_VERSION = 1
+TRACE_DIR = "aim_trainer_traces"
+
+# 记录字段：(名称, struct类型码)
+TRACE_FIELDS = (
+    ("elapsed", "I"),
+    ("x", "h"),
+    ("y", "h"),
+    ("hit", "B"),
+    ("balls", "B"),
+    ("score", "i"),
+)
+
+TRACE_HEADER = struct.Struct("<4sB")
+TRACE_RECORD = struct.Struct("<" + "".join(code for _, code in TRACE_FIELDS))